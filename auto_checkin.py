@@ -1,33 +1,188 @@
+import argparse
+import asyncio
+import json
+import math
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
 from zoneinfo import ZoneInfo
-import requests
+
 from loguru import logger
-from pydantic import BaseModel, Field
-from ext_notification import send_notification
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from requests.exceptions import ConnectionError, Timeout
+from typing_extensions import NotRequired, TypedDict
+
+from ext_notification import NotificationOutbox, build_digest
+from ext_retry import RetryPolicy
+from ext_storage import ProfileCache, ResultsWriter, SignLedger, token_hash
+from ext_taskgraph import TaskNode, run_task_graph
+from ext_tokens import TokenEntry, tokens_from_env
+from ext_transport import DeadlineExceeded, HttpTransport, current_deadline, deadline_scope, get_default_transport
+
+if TYPE_CHECKING:
+    # Only some runs use these; they are imported where they are needed to keep start-up cheap.
+    from ext_clock import ServerClock
+    from ext_concurrency import AimdController
+    from ext_fire import ResetFirer
+    from ext_ratelimit import RateLimiter
+    from ext_spread import SpreadScheduler
 
 class Response(BaseModel):
+    # The request path decodes through LazyResponse; only build the schema if the model is actually used.
+    model_config = ConfigDict(defer_build=True)
+
     code: int = Field(..., alias="code", description="返回值")
     msg: str = Field(..., alias="msg", description="提示信息")
     success: Optional[bool] = Field(None, alias="success", description="token有时才有")
     data: Optional[Any] = Field(None, alias="data", description="请求成功才有")
 
+class _ResponseHeader(TypedDict):
+    code: int
+    msg: str
+    success: NotRequired[Optional[bool]]
+
+@lru_cache(maxsize=None)
+def _response_header_validator() -> TypeAdapter:
+    """Validates code/msg/success straight from the JSON bytes; `data` is skipped by the parser without being decoded.
+
+    Built on first use so that importing this module does not pay for compiling it.
+    """
+    return TypeAdapter(_ResponseHeader)
+
+_UNDECODED = object()
+
+class LazyResponse:
+    """A Response whose code/msg/success are validated eagerly and whose data is decoded on first access.
+
+    Sign requests never look at ``data``, so most responses cost a single validation
+    pass instead of building a full pydantic model.
+    """
+    __slots__ = ("code", "msg", "success", "_content", "_data")
+
+    def __init__(self, content: bytes):
+        header = _response_header_validator().validate_json(content)
+        self.code: int = header["code"]
+        self.msg: str = header["msg"]
+        self.success: Optional[bool] = header.get("success")
+        self._content = content
+        self._data = _UNDECODED
+
+    @property
+    def data(self) -> Optional[Any]:
+        if self._data is _UNDECODED:
+            self._data = json.loads(self._content).get("data")
+        return self._data
+
+    def __repr__(self):
+        return f"LazyResponse(code={self.code!r}, msg={self.msg!r}, success={self.success!r})"
+
+def beijing_now() -> datetime:
+    """Current time in Beijing (UTC+8), the zone the daily sign reset follows, aligned to the API server's clock."""
+    return datetime.fromtimestamp(get_server_clock().now(), ZoneInfo('Asia/Shanghai'))
+
 class KurobbsClientException(Exception):
     """Custom exception for Kurobbs client errors."""
     pass
 
+class KurobbsRequestError(KurobbsClientException):
+    """A transient request failure: network error, 5xx/429 status or a body that is not a valid Response."""
+    pass
+
+# `msg` values the API returns when it throttles us.
+RATE_LIMIT_MARKERS = ("频繁", "稍后", "限流", "too many", "rate limit")
+
+_default_retry_policy: Optional[RetryPolicy] = None
+
+def get_default_retry_policy() -> RetryPolicy:
+    """Return the retry policy (and retry budget) shared by all clients of this process."""
+    global _default_retry_policy
+    if _default_retry_policy is None:
+        _default_retry_policy = RetryPolicy.from_env(retryable_exceptions=(KurobbsRequestError,))
+    return _default_retry_policy
+
+_server_clock: Optional["ServerClock"] = None
+
+def get_server_clock() -> "ServerClock":
+    """Return the estimate of the API server's clock, fed by every response of the default transport."""
+    global _server_clock
+    if _server_clock is None:
+        from ext_clock import ServerClock
+
+        api_base = os.getenv("KUROBBS_API_BASE") or KurobbsClient.API_BASE
+        _server_clock = ServerClock(host=urlsplit(api_base).hostname)
+        _server_clock.attach(get_default_transport().session)
+    return _server_clock
+
 class KurobbsClient:
+    API_BASE = "https://api.kurobbs.com"
     FIND_ROLE_LIST_API_URL = "https://api.kurobbs.com/gamer/role/default"
     SIGN_URL = "https://api.kurobbs.com/encourage/signIn/v2"
     USER_SIGN_URL = "https://api.kurobbs.com/user/signIn"
     USER_MINE_URL = "https://api.kurobbs.com/user/mineV2"
 
-    def __init__(self, token: str):
+    # (action_name, method_name, success_message, failure_message)
+    SIGN_ACTIONS = (
+        ("checkin", "checkin", "签到奖励签到成功", "签到奖励签到失败"),
+        ("sign_in", "sign_in", "社区签到成功", "社区签到失败"),
+    )
+    # action_name -> attribute holding the URL of its sign POST
+    SIGN_ACTION_URLS = {"checkin": "SIGN_URL", "sign_in": "USER_SIGN_URL"}
+    # Sign failures whose msg contains one of these mean the cached role/user is stale.
+    PROFILE_MISMATCH_MARKERS = ("角色", "用户", "role", "user")
+    # The server's answer to a sign request for an account that already signed today.
+    DUPLICATE_SIGN_CODE = 1511
+
+    def __init__(
+        self,
+        token: str,
+        transport: Optional[HttpTransport] = None,
+        profile_cache: Optional[ProfileCache] = None,
+        ledger: Optional[SignLedger] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        request_observer: Optional[Callable[[float, bool], None]] = None,
+        rate_limiter: Optional["RateLimiter"] = None,
+        api_base: Optional[str] = None,
+    ):
+        """
+        :param api_base: Send requests to this base URL instead of API_BASE (defaults to the KUROBBS_API_BASE
+            environment variable), e.g. a local ext_mock_api server.
+        :param request_observer: Called after every HTTP attempt with its latency and whether it was healthy
+            (no network error, 5xx/429, invalid body or throttling msg), e.g. ``AimdController.observe``.
+        """
         self.token = token
+        self.request_observer = request_observer
+        self.transport = transport or get_default_transport()
+        self.retry_policy = retry_policy or get_default_retry_policy()
+        if rate_limiter is None:
+            from ext_ratelimit import get_default_rate_limiter
+
+            rate_limiter = get_default_rate_limiter()
+        self.rate_limiter = rate_limiter
+        self.profile_cache = profile_cache
+        self.ledger = ledger
+        injected = transport is not None or api_base is not None
+        api_base = (api_base or os.getenv("KUROBBS_API_BASE") or "").rstrip("/")
+        if api_base:
+            for name in ("FIND_ROLE_LIST_API_URL", "SIGN_URL", "USER_SIGN_URL", "USER_MINE_URL"):
+                setattr(self, name, getattr(self, name).replace(self.API_BASE, api_base, 1))
+        if injected:
+            # The default transport and API base are sampled already; also sample what this client talks to.
+            server_clock = get_server_clock()
+            server_clock.watch(urlsplit(self.USER_MINE_URL).hostname)
+            server_clock.attach(self.transport.session)
+        self.sign_date = beijing_now().date().isoformat()
         self.result: Dict[str, str] = {}
+        # action name -> "success", "failed", "skipped" (done earlier today) or "error" (raised)
+        self.outcomes: Dict[str, str] = {}
         self.exceptions: List[Exception] = []
+        # URLs whose request needed more than one attempt; an earlier one may have reached the server.
+        self._retried_urls = set()
 
     def get_headers(self) -> Dict[str, str]:
         """Get the headers required for API requests."""
@@ -47,13 +202,52 @@ class KurobbsClient:
             "user-agent": "okhttp/3.10.0",
         }
 
-    def make_request(self, url: str, data: Dict[str, Any]) -> Response:
-        """Make a POST request to the specified URL with the given data."""
-        headers = self.get_headers()
-        response = requests.post(url, headers=headers, data=data)
-        res = Response.model_validate_json(response.content)
-        logger.debug(res.model_dump_json(indent=2, exclude={"data"}))
-        return res
+    def make_request(self, url: str, data: Dict[str, Any]) -> LazyResponse:
+        """Make a POST request to the specified URL with the given data, retrying transient failures."""
+        attempts = 0
+
+        def attempt() -> LazyResponse:
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                self._retried_urls.add(url)
+            return self._make_request_once(url, data)
+
+        return self.retry_policy.call(
+            attempt,
+            retry_result=self._rate_limit_reason,
+            description=f"POST {url}",
+        )
+
+    def _make_request_once(self, url: str, data: Dict[str, Any]) -> LazyResponse:
+        self.rate_limiter.acquire(url)
+        started = time.monotonic()
+        healthy = False
+        try:
+            headers = self.get_headers()
+            try:
+                response = self.transport.post(url, headers=headers, data=data)
+            except (ConnectionError, Timeout) as e:
+                raise KurobbsRequestError(f"{type(e).__name__} from {url}: {e}") from e
+            if response.status_code >= 500 or response.status_code == 429:
+                raise KurobbsRequestError(f"HTTP {response.status_code} from {url}")
+            try:
+                res = LazyResponse(response.content)
+            except ValidationError:
+                raise KurobbsRequestError(f"Invalid response from {url} (HTTP {response.status_code})") from None
+            logger.debug("{!r}", res)
+            healthy = self._rate_limit_reason(res) is None
+            return res
+        finally:
+            if self.request_observer:
+                self.request_observer(time.monotonic() - started, healthy)
+
+    @staticmethod
+    def _rate_limit_reason(res: LazyResponse) -> Optional[str]:
+        """Return the msg of a throttled response, None for anything else."""
+        if not res.success and any(marker in res.msg.lower() for marker in RATE_LIMIT_MARKERS):
+            return f"rate limited: {res.msg}"
+        return None
 
     def get_mine_info(self, type: int = 1):
         """Get mine info"""
@@ -67,31 +261,58 @@ class KurobbsClient:
         res = self.make_request(self.FIND_ROLE_LIST_API_URL, data)
         return res.data
 
-    def checkin(self) -> Response:
-        """Perform the check-in operation."""
+    def get_role_info(self) -> Dict[str, Any]:
+        """Look up the default role of the account and refresh the profile cache."""
         mine_info = self.get_mine_info()
         user_game_list = self.get_user_game_list(user_id=mine_info.get("mine", {}).get("userId", 0))
-        # 获取北京时间（UTC+8）
-        beijing_tz = ZoneInfo('Asia/Shanghai')
-        beijing_time = datetime.now(beijing_tz)
+        return self._remember_role_info(user_game_list)
+
+    def checkin(self) -> LazyResponse:
+        """Perform the check-in operation."""
+        role_info = self._cached_role_info()
+        if role_info is None:
+            return self.make_request(self.SIGN_URL, self._build_sign_data(self.get_role_info()))
+        resp = self.make_request(self.SIGN_URL, self._build_sign_data(role_info))
+        if not self._is_profile_mismatch(resp):
+            return resp
+        logger.info("Cached profile rejected by the server, looking it up again")
+        self.profile_cache.invalidate(self.token)
+        return self.make_request(self.SIGN_URL, self._build_sign_data(self.get_role_info()))
+
+    def _cached_role_info(self) -> Optional[Dict[str, Any]]:
+        return self.profile_cache.get(self.token) if self.profile_cache else None
+
+    def _remember_role_info(self, user_game_list: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the default role from the role list and store it in the profile cache."""
         role_info = user_game_list.get("defaultRoleList", [])[0]
-        data = {
+        if self.profile_cache:
+            self.profile_cache.put(self.token, role_info)
+        return role_info
+
+    def _is_profile_mismatch(self, resp: LazyResponse) -> bool:
+        return not resp.success and any(marker in resp.msg for marker in self.PROFILE_MISMATCH_MARKERS)
+
+    @staticmethod
+    def _build_sign_data(role_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the check-in form body for the given role."""
+        # 获取北京时间（UTC+8）
+        beijing_time = beijing_now()
+        return {
             "gameId": role_info.get("gameId", 2),
             "serverId": role_info.get("serverId", None),
             "roleId": role_info.get("roleId", 0),
             "userId": role_info.get("userId", 0),
             "reqMonth": f"{beijing_time.month:02d}",
         }
-        return self.make_request(self.SIGN_URL, data)
 
-    def sign_in(self) -> Response:
+    def sign_in(self) -> LazyResponse:
         """Perform the sign-in operation."""
         return self.make_request(self.USER_SIGN_URL, {"gameId": 2})
 
     def _process_sign_action(
         self,
         action_name: str,
-        action_method: Callable[[], Response],
+        action_method: Callable[[], LazyResponse],
         success_message: str,
         failure_message: str,
     ):
@@ -102,26 +323,66 @@ class KurobbsClient:
         :param failure_message: The message to log on failure.
         """
         resp = action_method()
-        logger.debug(resp)
-        if resp.success:
+        self.record_sign_result(action_name, resp, success_message, failure_message)
+
+    def record_sign_result(self, action_name: str, resp: LazyResponse, success_message: str, failure_message: str):
+        """Store the outcome of a sign-in action in result/exceptions."""
+        logger.debug("{!r}", resp)
+        duplicate = not resp.success and self._is_retried_duplicate(action_name, resp)
+        if duplicate:
+            logger.info(f"{action_name}: an earlier, failed attempt already signed, counting it as done")
+        if resp.success or duplicate:
             self.result[action_name] = success_message
+            self.outcomes[action_name] = "success"
+            if self.ledger:
+                self.ledger.record(self.token, self.sign_date, action_name)
         else:
+            self.outcomes[action_name] = "failed"
             self.exceptions.append(KurobbsClientException(f'{failure_message}, {resp.msg}'))
 
+    def send_sign(self, action: Tuple[str, str, str, str], data: Union[str, Dict[str, Any]]):
+        """Send the sign POST of ``action`` (an entry of SIGN_ACTIONS) with a prepared body and record the outcome.
+
+        Unlike ``start``, an error is recorded in ``exceptions`` instead of raised (see ext_plan.fire_plan).
+        """
+        action_name, _, success_message, failure_message = action
+        try:
+            resp = self.make_request(getattr(self, self.SIGN_ACTION_URLS[action_name]), data)
+        except Exception as e:
+            self.outcomes[action_name] = "error"
+            self.exceptions.append(e)
+            return
+        self.record_sign_result(action_name, resp, success_message, failure_message)
+
+    def _is_retried_duplicate(self, action_name: str, resp: LazyResponse) -> bool:
+        """Whether ``resp`` rejects a duplicate sign after an earlier attempt of the same call was retried.
+
+        A timeout, reset, truncated body or gateway 5xx can hide a sign the server did
+        make, so the retry is then answered with "请勿重复签到".
+        """
+        url = getattr(self, self.SIGN_ACTION_URLS[action_name])
+        return resp.code == self.DUPLICATE_SIGN_CODE and url in self._retried_urls
+
+    def pending_actions(self):
+        """SIGN_ACTIONS minus those the ledger says already succeeded today."""
+        for action in self.SIGN_ACTIONS:
+            action_name, _, success_message, _ = action
+            if self.ledger and self.ledger.is_done(self.token, self.sign_date, action_name):
+                logger.debug("{} already done on {}, skipping", action_name, self.sign_date)
+                self.result[action_name] = success_message
+                self.outcomes[action_name] = "skipped"
+                continue
+            yield action
+
     def start(self):
         """Start the sign-in process."""
-        self._process_sign_action(
-            action_name="checkin",
-            action_method=self.checkin,
-            success_message="签到奖励签到成功",
-            failure_message="签到奖励签到失败",
-        )
-        self._process_sign_action(
-            action_name="sign_in",
-            action_method=self.sign_in,
-            success_message="社区签到成功",
-            failure_message="社区签到失败",
-        )
+        for action_name, method_name, success_message, failure_message in self.pending_actions():
+            self._process_sign_action(
+                action_name=action_name,
+                action_method=getattr(self, method_name),
+                success_message=success_message,
+                failure_message=failure_message,
+            )
         self._log()
 
     @property
@@ -135,43 +396,467 @@ class KurobbsClient:
         if self.exceptions:
             raise KurobbsClientException("; ".join(map(str, self.exceptions)))
 
-def configure_logger(debug: bool = False):
-    """Configure the logger based on the debug mode."""
+class AsyncKurobbsClient(KurobbsClient):
+    """Asyncio variant of KurobbsClient.
+
+    The blocking HTTP calls are pushed to the event loop's default executor, so many
+    accounts can be in flight at once while the request/response handling stays shared
+    with KurobbsClient.
+    """
+
+    async def make_request_async(self, url: str, data: Dict[str, Any]) -> LazyResponse:
+        """Make a POST request without blocking the event loop."""
+        return await asyncio.to_thread(self.make_request, url, data)
+
+    async def get_mine_info_async(self, type: int = 1):
+        """Get mine info"""
+        res = await self.make_request_async(self.USER_MINE_URL, {"type": type})
+        return res.data
+
+    async def get_user_game_list_async(self, user_id: int) -> List[Dict[str, Any]]:
+        """Get the list of games for the user."""
+        res = await self.make_request_async(self.FIND_ROLE_LIST_API_URL, {"queryUserId": user_id})
+        return res.data
+
+    async def get_role_info_async(self) -> Dict[str, Any]:
+        """Look up the default role of the account and refresh the profile cache."""
+        mine_info = await self.get_mine_info_async()
+        user_game_list = await self.get_user_game_list_async(user_id=mine_info.get("mine", {}).get("userId", 0))
+        return self._remember_role_info(user_game_list)
+
+    def checkin_nodes(self) -> List[TaskNode]:
+        """Task graph nodes of the check-in: mine -> roles -> checkin, or just checkin when the profile is cached."""
+        role_info = self._cached_role_info()
+        if role_info is not None:
+            return [TaskNode("checkin", lambda: self._checkin_with_cached_role(role_info))]
+
+        async def roles(mine):
+            return await self.get_user_game_list_async(user_id=mine.get("mine", {}).get("userId", 0))
+
+        async def checkin(roles):
+            role_info = self._remember_role_info(roles)
+            return await self.make_request_async(self.SIGN_URL, self._build_sign_data(role_info))
+
+        return [
+            TaskNode("mine", self.get_mine_info_async),
+            TaskNode("roles", roles, deps=["mine"]),
+            TaskNode("checkin", checkin, deps=["roles"]),
+        ]
+
+    async def _checkin_with_cached_role(self, role_info: Dict[str, Any]) -> LazyResponse:
+        resp = await self.make_request_async(self.SIGN_URL, self._build_sign_data(role_info))
+        if not self._is_profile_mismatch(resp):
+            return resp
+        logger.info("Cached profile rejected by the server, looking it up again")
+        self.profile_cache.invalidate(self.token)
+        return await self.make_request_async(self.SIGN_URL, self._build_sign_data(await self.get_role_info_async()))
+
+    def sign_in_nodes(self) -> List[TaskNode]:
+        """Task graph nodes of the community sign-in, which depends on nothing."""
+        return [TaskNode("sign_in", self.sign_in_async)]
+
+    async def checkin_async(self) -> LazyResponse:
+        """Perform the check-in operation."""
+        return await self._run_action_nodes("checkin", self.checkin_nodes())
+
+    async def sign_in_async(self) -> LazyResponse:
+        """Perform the sign-in operation."""
+        return await self.make_request_async(self.USER_SIGN_URL, {"gameId": 2})
+
+    @staticmethod
+    async def _run_action_nodes(action_name: str, nodes: List[TaskNode]) -> LazyResponse:
+        result = (await run_task_graph(nodes))[action_name]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def build_task_graph(self, actions) -> List[TaskNode]:
+        """Collect the nodes of every action; an action ``foo`` contributes ``self.foo_nodes()``."""
+        nodes: List[TaskNode] = []
+        for _, method_name, _, _ in actions:
+            nodes.extend(getattr(self, f"{method_name}_nodes")())
+        return nodes
+
+    async def start_async(self):
+        """Start the sign-in process, running independent actions concurrently."""
+        actions = list(self.pending_actions())
+        results = await run_task_graph(self.build_task_graph(actions))
+        errors = []
+        for action_name, _, success_message, failure_message in actions:
+            resp = results[action_name]
+            if isinstance(resp, BaseException):
+                self.outcomes[action_name] = "error"
+                errors.append(resp)
+            else:
+                self.record_sign_result(action_name, resp, success_message, failure_message)
+        if errors:
+            raise errors[0]
+        self._log()
+
+def configure_logger(debug: bool = False, enqueue: bool = False):
+    """Configure the logger based on the debug mode.
+
+    Debug messages on the request path use loguru's ``{}`` arguments, so they are only
+    formatted when DEBUG is enabled. With ``enqueue`` the records are handed to a
+    background thread and writing to stdout never blocks request workers.
+    """
     logger.remove()  # Remove default logger configuration
     log_level = "DEBUG" if debug else "INFO"
-    logger.add(sys.stdout, level=log_level)
+    logger.add(sys.stdout, level=log_level, enqueue=enqueue)
 
-def main():
-    """Main function to handle command-line arguments and start the sign-in process for multiple accounts."""
-    token_str = os.getenv("TOKEN")
-    if not token_str:
-        logger.error("TOKEN environment variable is not set.")
-        sys.exit(1)
-    tokens = [token.strip() for token in token_str.split(";")]
-    messages = []
+async def run_accounts(
+    tokens: Iterable[Union[str, TokenEntry]],
+    concurrency: int,
+    profile_cache: Optional[ProfileCache] = None,
+    ledger: Optional[SignLedger] = None,
+    reserve: float = 0.0,
+    min_account_time: float = 10.0,
+    controller: Optional["AimdController"] = None,
+    results: Optional[ResultsWriter] = None,
+    spread: Optional["SpreadScheduler"] = None,
+) -> Tuple[List[str], bool]:
+    """Run every account with at most ``concurrency`` of them in flight.
+
+    ``tokens`` is consumed lazily (in a worker thread, so it may block on a pipe) and
+    only a small window of accounts is read ahead of the ones running, so a stream of
+    any length is processed with flat memory and the first accounts start immediately.
+
+    With a ``controller`` the limit adapts to the API instead (capped by its max_limit),
+    and every request of every account feeds it.
+
+    If a deadline is active (see ``deadline_scope``), each account gets a fair share of
+    the time left minus ``reserve`` (but at least ``min_account_time``), and accounts
+    that cannot start before the deadline are reported as deferred. With a stream the
+    share is computed over the accounts read so far.
+
+    With ``results``, one record per account is written there as it completes and no
+    messages are kept in memory.
+
+    With ``spread``, the accounts start at their offsets within its window (shortened to
+    fit a deadline) instead of as soon as a slot is free. The token stream is then read
+    fully up front, to sort it by offset.
+
+    :return: The per-account messages in token order (empty with ``results``) and whether any account failed.
+    """
+    limiter = controller or asyncio.Semaphore(concurrency)
+
+    def observer(latency: float, healthy: bool):
+        if controller:
+            controller.observe(latency, healthy)
+        if spread:
+            spread.observe(latency, healthy)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency * len(KurobbsClient.SIGN_ACTIONS)))
+    read_ahead = 2 * (controller.max_limit if controller else concurrency)
+    unstarted = 0
+
+    def account_time() -> Optional[float]:
+        """Time allotted to the next account, or 0 if the run is out of time."""
+        deadline = current_deadline()
+        if deadline is None:
+            return None
+        available = deadline.remaining() - reserve
+        if available <= 0:
+            return 0
+        waves = math.ceil((unstarted + 1) / (controller.limit if controller else concurrency))
+        return min(available, max(available / waves, min_account_time))
+
+    async def sign_one(name: str, entry: TokenEntry) -> Tuple[Optional[str], Optional[BaseException], Dict[str, str]]:
+        """Sign one account; returns its message, the exception that failed it and the per-action outcomes."""
+        nonlocal unstarted
+        async with limiter:
+            unstarted -= 1
+            allotted = account_time()
+            if allotted == 0:
+                logger.warning(f"Run deadline reached, deferring {name}")
+                return f"{name}: Deferred - run deadline reached", DeadlineExceeded("run deadline reached"), {}
+            if spread:
+                spread.account_started(entry.token)
+            kurobbs = AsyncKurobbsClient(
+                entry.token,
+                profile_cache=profile_cache,
+                ledger=ledger,
+                request_observer=observer if controller or spread else None,
+            )
+            try:
+                with deadline_scope(allotted):
+                    await kurobbs.start_async()
+                return (f"{name}: {kurobbs.msg}" if kurobbs.msg else None), None, kurobbs.outcomes
+            except KurobbsClientException as e:
+                return f"{name}: Error - {str(e)}", e, kurobbs.outcomes
+            except DeadlineExceeded as e:
+                return f"{name}: Error - {str(e)}", e, kurobbs.outcomes
+            except Exception as e:
+                logger.exception(f"An unexpected error occurred for {name}: {e}")
+                return f"{name}: Unexpected error - {str(e)}", e, kurobbs.outcomes
+
+    async def run_one(i: int, entry: TokenEntry) -> Tuple[int, Optional[str], bool]:
+        name = f"Account {i} ({entry.label})" if entry.label else f"Account {i}"
+        started = time.perf_counter()
+        message, error, outcomes = await sign_one(name, entry)
+        if results is None:
+            return i, message, error is not None
+        results.write({
+            "position": i,
+            "token": token_hash(entry.token),
+            "label": entry.label,
+            "ok": error is None,
+            "actions": outcomes,
+            "latency": round(time.perf_counter() - started, 3),
+            "error": type(error).__name__ if error is not None else None,
+            "error_message": str(error) if error is not None else None,
+            "message": message,
+            "finished_at": round(time.time(), 3),
+        })
+        return i, None, error is not None
+
+    entries = enumerate((TokenEntry(entry) if isinstance(entry, str) else entry for entry in tokens), start=1)
+    if spread:
+        deadline = current_deadline()
+        if deadline is not None:
+            spread.fit(deadline.remaining() - reserve - min_account_time)
+        entries = iter(await asyncio.to_thread(spread.order, entries))
+        spread.start()
+    pending = set()
+    messages: List[Tuple[int, str]] = []
     any_failed = False
-    for i, token in enumerate(tokens, start=1):
-        if not token:
+
+    def collect(done: Iterable[Tuple[int, Optional[str], bool]]):
+        nonlocal any_failed
+        for position, message, failed in done:
+            any_failed = any_failed or failed
+            if message:
+                messages.append((position, message))
+
+    while True:
+        item = await asyncio.to_thread(next, entries, None)
+        if item is None:
+            break
+        i, entry = item
+        if spread:
+            await spread.wait(entry.token)
+        if not entry.token:
             logger.warning(f"Empty token found at position {i}")
             continue
-        kurobbs = KurobbsClient(token)
+        unstarted += 1
+        pending.add(asyncio.create_task(run_one(i, entry)))
+        if len(pending) >= read_ahead:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(task.result() for task in done)
+    if pending:
+        collect(await asyncio.gather(*pending))
+    messages.sort()
+    return [message for _, message in messages], any_failed
+
+def build_notification(results: ResultsWriter, duration: float) -> str:
+    """The notification text of a run, read back from its results file.
+
+    NOTIFY_MODE=detail sends one line per account, ``digest`` a summary of constant size
+    (see ``build_digest``), and ``auto`` (default) switches to the digest above
+    NOTIFY_DIGEST_THRESHOLD accounts.
+    """
+    mode = os.getenv("NOTIFY_MODE", "auto").lower()
+    if mode == "auto":
+        accounts = sum(1 for _ in results.read())
+        mode = "digest" if accounts > int(os.getenv("NOTIFY_DIGEST_THRESHOLD", "20")) else "detail"
+    if mode == "digest":
+        return build_digest(results.read(), duration, details_path=str(results.path))
+    records = sorted((record for record in results.read() if record.get("message")), key=lambda record: record["position"])
+    return "\n".join(record["message"] for record in records)
+
+def main():
+    """Main function to handle command-line arguments and start the sign-in process for multiple accounts."""
+    configure_from_env()
+    tokens = tokens_or_exit()
+    profile_cache = ProfileCache.from_env()
+    firer = None
+    if os.getenv("FIRE_AT_RESET", "").lower() in ("1", "true", "yes"):
+        from ext_fire import ResetFirer
+
+        if profile_cache.ttl <= 0:
+            logger.warning("FIRE_AT_RESET needs the profile cache, enabling it for one day")
+            profile_cache = ProfileCache(profile_cache.path, ttl=24 * 3600)
+        firer = ResetFirer.from_env(max(1, int(os.getenv("CONCURRENCY", "8"))), profile_cache, server_clock=get_server_clock())
+        tokens = list(tokens)  # read once for the lookups before the reset and once for the run after it
+
+    # Reports a previous run could not deliver are retried in the background while this one signs in.
+    outbox = NotificationOutbox.from_env()
+    outbox.start()
+    any_failed = execute_run(tokens, profile_cache, SignLedger.from_env(), outbox, firer)
+    logger.complete()
+    if any_failed:
+        sys.exit(1)
+
+def execute_run(
+    tokens: Iterable[TokenEntry],
+    profile_cache: ProfileCache,
+    ledger: SignLedger,
+    outbox: NotificationOutbox,
+    firer: Optional["ResetFirer"] = None,
+    results: Optional[ResultsWriter] = None,
+) -> bool:
+    """Sign in every account under RUN_DEADLINE and report the run.
+
+    :param results: Where to write the per-account records (RESULTS_PATH by default).
+    :return: Whether any account failed.
+    """
+    concurrency = max(1, int(os.getenv("CONCURRENCY", "8")))
+    run_deadline = float(os.getenv("RUN_DEADLINE", "0")) or None
+    notify_reserve = float(os.getenv("NOTIFY_RESERVE", "20"))
+    controller = spread = None
+    if os.getenv("ADAPTIVE_CONCURRENCY", "").lower() in ("1", "true", "yes"):
+        from ext_concurrency import AimdController
+
+        controller = AimdController.from_env(max_limit=concurrency)
+    if float(os.getenv("SPREAD_WINDOW", "0")) > 0:
+        from ext_spread import SpreadScheduler
+
+        spread = SpreadScheduler.from_env()
+    results = results or ResultsWriter.from_env()
+
+    if firer:
+        # Waits for the reset; RUN_DEADLINE bounds the run after it, not the wait.
+        asyncio.run(firer.prepare(tokens))
+    with deadline_scope(run_deadline):
+        started = time.perf_counter()
         try:
-            kurobbs.start()
-            if kurobbs.msg:
-                messages.append(f"Account {i}: {kurobbs.msg}")
-        except KurobbsClientException as e:
-            messages.append(f"Account {i}: Error - {str(e)}")
-            any_failed = True
-        except Exception as e:
-            logger.exception(f"An unexpected error occurred for account {i}: {e}")
-            messages.append(f"Account {i}: Unexpected error - {str(e)}")
-            any_failed = True
+            _, any_failed = asyncio.run(run_accounts(
+                tokens, concurrency, profile_cache, ledger, notify_reserve, controller=controller, results=results, spread=spread
+            ))
+        finally:
+            profile_cache.flush()
+            ledger.close()
+            results.close()
+        duration = time.perf_counter() - started
+        if firer:
+            logger.info(f"Fire window after the reset: {firer.window(results.read())}")
+            get_server_clock().log_estimate()
+        if controller:
+            logger.info(f"Adaptive concurrency settled at {controller.limit}: {controller.stats()}")
+        if spread:
+            logger.info(f"Account starts spread: {spread.stats()}")
+        report_run(results, duration, outbox, notify_reserve)
+    return any_failed
+
+def report_run(results: ResultsWriter, duration: float, outbox: NotificationOutbox, notify_reserve: float):
+    """Log the transport and retry stats and queue the run's notification, waiting for its delivery."""
+    logger.info(f"HTTP pool stats: {get_default_transport().stats()}")
+    logger.info(f"Retry stats: {get_default_retry_policy().stats()}")
+    if message := build_notification(results, duration):
+        outbox.put(message)
+    deadline = current_deadline()
+    outbox.drain(min(notify_reserve, max(1.0, deadline.remaining())) if deadline else notify_reserve)
+
+def configure_from_env():
+    configure_logger(
+        debug=os.getenv("DEBUG", "").lower() in ("1", "true", "yes"),
+        enqueue=os.getenv("LOG_ENQUEUE", "").lower() in ("1", "true", "yes"),
+    )
+
+def tokens_or_exit() -> Iterable[TokenEntry]:
+    tokens = tokens_from_env()
+    if tokens is None:
+        logger.error("Neither TOKEN nor TOKEN_FILE environment variable is set.")
+        sys.exit(1)
+    return tokens
+
+def prepare(argv: Optional[List[str]] = None):
+    """Read-only phase of a two-phase run: validate the tokens and write the execution plan (see ext_plan)."""
+    from ext_plan import default_plan_path, prepare_plan
 
-    if messages:
-        send_notification("\n".join(messages))
+    parser = argparse.ArgumentParser(prog="auto_checkin.py prepare")
+    parser.add_argument("--plan", type=Path, default=default_plan_path(), help="Where to write the plan")
+    args = parser.parse_args(argv)
+    configure_from_env()
+    concurrency = max(1, int(os.getenv("CONCURRENCY", "8")))
+    started = time.perf_counter()
+    planned, rejected = asyncio.run(prepare_plan(tokens_or_exit(), concurrency, args.plan))
+    logger.info(f"Planned {planned} account(s), rejected {rejected}, in {time.perf_counter() - started:.2f}s: {args.plan}")
+    logger.complete()
+    sys.exit(1 if rejected else 0)
 
+def fire(argv: Optional[List[str]] = None):
+    """Write phase of a two-phase run: send only the sign requests of a prepared plan."""
+    from ext_plan import ExecutionPlan, default_plan_path, fire_plan
+
+    parser = argparse.ArgumentParser(prog="auto_checkin.py fire")
+    parser.add_argument("--plan", type=Path, default=default_plan_path(), help="Plan written by prepare")
+    args = parser.parse_args(argv)
+    configure_from_env()
+    plan = ExecutionPlan.load(args.plan)
+    if plan.header.get("api_base") != os.getenv("KUROBBS_API_BASE"):
+        logger.warning(f"The plan was prepared against {plan.header.get('api_base') or KurobbsClient.API_BASE}")
+    concurrency = max(1, int(os.getenv("CONCURRENCY", "8")))
+    ledger = SignLedger.from_env()
+    results = ResultsWriter.from_env()
+    outbox = NotificationOutbox.from_env()
+    outbox.start()
+    with deadline_scope(float(os.getenv("RUN_DEADLINE", "0")) or None):
+        started = time.perf_counter()
+        try:
+            _, any_failed = fire_plan(plan, tokens_or_exit(), concurrency, ledger, results)
+        finally:
+            ledger.close()
+            results.close()
+        report_run(results, time.perf_counter() - started, outbox, float(os.getenv("NOTIFY_RESERVE", "20")))
+    logger.complete()
     if any_failed:
         sys.exit(1)
 
+def daemon(argv: Optional[List[str]] = None):
+    """Stay resident and sign in on DAEMON_SCHEDULE, keeping the pool and profiles warm (see ext_daemon)."""
+    from ext_daemon import serve
+    from ext_fire import ResetFirer
+
+    configure_from_env()
+    tokens_or_exit()
+    token_file = os.getenv("TOKEN_FILE", "")
+    if token_file == "-" or token_file.startswith("fd:"):
+        logger.error("Daemon mode re-reads the tokens for every run, set TOKEN or a TOKEN_FILE path.")
+        sys.exit(1)
+    concurrency = max(1, int(os.getenv("CONCURRENCY", "8")))
+    profile_cache = ProfileCache.from_env()
+    if profile_cache.ttl <= 0:
+        logger.warning("Daemon mode keeps profiles warm, enabling the profile cache for one day")
+        profile_cache = ProfileCache(profile_cache.path, ttl=24 * 3600)
+    ledger = SignLedger.from_env()
+    if "RESUME" not in os.environ:
+        # A second run on the same day (e.g. triggered by hand) only retries what failed.
+        ledger.resume = True
+    firer = ResetFirer(concurrency, profile_cache, server_clock=get_server_clock())
+    outbox = NotificationOutbox.from_env()
+    outbox.start()
+
+    def run() -> Dict[str, Any]:
+        results = ResultsWriter.from_env()
+        any_failed = execute_run(tokens_from_env() or (), profile_cache, ledger, outbox, results=results)
+        accounts = failed = 0
+        for record in results.read():
+            accounts += 1
+            failed += not record.get("ok")
+        return {"ok": not any_failed, "accounts": accounts, "failed": failed}
+
+    def warm() -> int:
+        started = time.perf_counter()
+        accounts = asyncio.run(firer.warm_up(tokens_from_env() or ()))
+        profile_cache.flush()
+        logger.info(f"Warmed up {accounts} account(s) in {time.perf_counter() - started:.2f}s")
+        return accounts
+
+    serve(run, warm)
+    logger.complete()
+
+def bench(argv: Optional[List[str]] = None):
+    """Benchmark the multi-account run offline against the local mock API (see ext_bench)."""
+    from ext_bench import bench as run_bench
+
+    sys.exit(run_bench(argv))
+
 if __name__ == "__main__":
-    main()
+    # The ext_* modules import auto_checkin lazily; let them share this module (and its
+    # retry budget and server clock) instead of loading a second copy.
+    sys.modules.setdefault("auto_checkin", sys.modules[__name__])
+    commands = {"bench": bench, "prepare": prepare, "fire": fire, "daemon": daemon}
+    if sys.argv[1:2] and sys.argv[1] in commands:
+        commands[sys.argv[1]](sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,307 @@
+"""Offline benchmark of the multi-account run against the local mock API (ext_mock_api).
+
+Run::
+
+    python auto_checkin.py bench --accounts 1 100 10000 --output bench.json
+    python auto_checkin.py bench compare baseline.json bench.json
+    python auto_checkin.py bench decode    # per-response decoding cost, pydantic model vs LazyResponse
+    python auto_checkin.py bench imports   # cold-start import time of auto_checkin vs ext_minimal
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from ext_stats import percentile
+from ext_storage import ResultsWriter
+from ext_transport import HttpTransport, set_default_transport
+
+# URL path -> phase name used in reports
+PHASES = {
+    "/user/mineV2": "mine",
+    "/gamer/role/default": "role_list",
+    "/encourage/signIn/v2": "checkin",
+    "/user/signIn": "sign_in",
+}
+
+
+class TimingTransport(HttpTransport):
+    """HttpTransport that records the round-trip time of every request per phase."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def request(self, method: str, url: str, **kwargs: Any):
+        started = time.perf_counter()
+        try:
+            return super().request(method, url, **kwargs)
+        finally:
+            phase = next((name for path, name in PHASES.items() if url.endswith(path)), "other")
+            self.latencies[phase].append(time.perf_counter() - started)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean_ms": round(1000 * sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "p99_ms": round(1000 * percentile(values, 99), 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+class MockServerProcess:
+    """Runs ext_mock_api in a child process so its memory does not count towards the client's RSS."""
+
+    def __init__(self, extra_args: Sequence[str] = ()):
+        self.extra_args = list(extra_args)
+        self.process: Optional[subprocess.Popen] = None
+        self.url = ""
+
+    def __enter__(self) -> "MockServerProcess":
+        script = Path(__file__).with_name("ext_mock_api.py")
+        self.process = subprocess.Popen(
+            [sys.executable, str(script), "--port", "0", *self.extra_args],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        line = self.process.stdout.readline()
+        if "listening on" not in line:
+            self.process.kill()
+            raise RuntimeError(f"Mock API failed to start: {line!r}")
+        self.url = line.rsplit(" ", 1)[-1].strip()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+def run_once(accounts: int, concurrency: int, server_args: Sequence[str]) -> Dict[str, Any]:
+    """Run ``accounts`` synthetic accounts through run_accounts() against a fresh mock server."""
+    from auto_checkin import get_default_retry_policy, run_accounts
+
+    retries_before = get_default_retry_policy().stats()
+    transport = TimingTransport(pool_maxsize=max(32, concurrency * 2))
+    set_default_transport(transport)
+    tokens = [f"bench-{accounts}-{i}" for i in range(accounts)]
+    with MockServerProcess(server_args) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["KUROBBS_API_BASE"] = server.url
+        results = ResultsWriter(Path(tmp_dir) / "results.jsonl")
+        started = time.perf_counter()
+        try:
+            asyncio.run(run_accounts(tokens, concurrency, results=results))
+        finally:
+            results.close()
+        wall_time = time.perf_counter() - started
+        failed = sum(1 for record in results.read() if not record["ok"])
+    retries_after = get_default_retry_policy().stats()
+    all_latencies = [value for values in transport.latencies.values() for value in values]
+    return {
+        "accounts": accounts,
+        "concurrency": concurrency,
+        "wall_time_s": round(wall_time, 4),
+        "accounts_per_second": round(accounts / wall_time, 2) if wall_time else 0.0,
+        "failed_accounts": failed,
+        "requests": len(all_latencies),
+        "endpoints": {phase: summarize(values) for phase, values in sorted(transport.latencies.items())},
+        "all_requests": summarize(all_latencies),
+        "pool": transport.stats(),
+        "retries": {key: retries_after[key] - retries_before[key] for key in retries_after},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    server_args = list(args.server_arg)
+    if args.latency:
+        server_args += ["--latency", args.latency]
+    if args.faults:
+        server_args += ["--faults", args.faults]
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server_args": server_args,
+        },
+        "runs": [],
+    }
+    for accounts in args.accounts:
+        result = run_once(accounts, args.concurrency, server_args)
+        report["runs"].append(result)
+        endpoints = ", ".join(f"{phase} p50/p95/p99={s['p50_ms']}/{s['p95_ms']}/{s['p99_ms']}ms"
+                              for phase, s in result["endpoints"].items())
+        print(f"{accounts:>6} accounts: {result['accounts_per_second']:>9} acc/s, "
+              f"wall {result['wall_time_s']}s, failed {result['failed_accounts']}, "
+              f"retries {result['retries']['retries']}, rss {result['peak_rss_mb']}MB | {endpoints}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Results written to {args.output}")
+    return 0
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print the relative change of every metric; return 1 if any regressed by more than ``threshold``."""
+    baseline = {run["accounts"]: run for run in json.loads(Path(baseline_path).read_text(encoding="utf-8"))["runs"]}
+    candidate = {run["accounts"]: run for run in json.loads(Path(candidate_path).read_text(encoding="utf-8"))["runs"]}
+    regressions = 0
+
+    def row(label: str, old: float, new: float, higher_is_better: bool):
+        nonlocal regressions
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif worse < -threshold:
+            flag = "  improved"
+        print(f"  {label:<24} {old:>12} -> {new:>12} ({change:+.1%}){flag}")
+
+    for accounts in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[accounts], candidate[accounts]
+        print(f"{accounts} accounts")
+        row("accounts/s", old["accounts_per_second"], new["accounts_per_second"], True)
+        row("wall time (s)", old["wall_time_s"], new["wall_time_s"], False)
+        row("peak RSS (MB)", old["peak_rss_mb"], new["peak_rss_mb"], False)
+        for phase in sorted(old["endpoints"].keys() & new["endpoints"].keys()):
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                row(f"{phase} {metric}", old["endpoints"][phase][metric], new["endpoints"][phase][metric], False)
+    print(f"{regressions} regression(s) beyond {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def decode_bench(number: int) -> int:
+    """Compare the per-response cost of the old pydantic path with LazyResponse on mock API payloads."""
+    from auto_checkin import LazyResponse, Response
+    from ext_mock_api import AccountState, ok
+
+    account = AccountState("bench")
+    role = {"gameId": 2, "serverId": account.server_id, "roleId": account.role_id, "userId": account.user_id}
+    payloads = {
+        "mine": ok({"mine": {"userId": account.user_id, "userName": "bench"}}),
+        "role_list": ok({"defaultRoleList": [role]}),
+        "checkin": ok({"todayList": [{"goodsName": "星声", "goodsNum": 50}], "tomorrowList": []}),
+        "sign_in": ok({"gainVoList": [{"gainTyp": 1, "gainValue": 10}], "continueDays": 1}),
+    }
+
+    def pydantic_path(content: bytes):
+        res = Response.model_validate_json(content)
+        res.model_dump_json(indent=2, exclude={"data"})
+        return res.data
+
+    def lazy_path(content: bytes):
+        return LazyResponse(content)
+
+    def lazy_path_with_data(content: bytes):
+        return LazyResponse(content).data
+
+    def timed(func: Callable[[bytes], Any], content: bytes) -> float:
+        func(content)  # the first call pays one-time costs such as the deferred pydantic schema build
+        return 1e6 * timeit.timeit(lambda: func(content), number=number) / number
+
+    print(f"{'payload':<10} {'pydantic+dump':>14} {'lazy':>10} {'lazy+data':>10}  (µs per response)")
+    slower = []
+    for name, payload in payloads.items():
+        content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        timings = [timed(func, content) for func in (pydantic_path, lazy_path, lazy_path_with_data)]
+        print(f"{name:<10} {timings[0]:>14.2f} {timings[1]:>10.2f} {timings[2]:>10.2f}")
+        if timings[2] > timings[0]:
+            slower.append(name)
+    if slower:
+        # The body is parsed twice: once for code/msg/success, once more for data.
+        print(f"lazy+data is slower than pydantic+dump for {', '.join(slower)}; "
+              "lazy only wins for responses whose data is never read (the sign requests)")
+    return 0
+
+
+def import_times(module: str) -> Tuple[int, Dict[str, int]]:
+    """Run ``python -X importtime -c "import module"``.
+
+    :return: Total import time in µs, and the cumulative time of each direct import of ``module``.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, children = 0, {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        if not match:
+            continue
+        depth = len(match.group(2)) // 2
+        if depth == 0:
+            total += int(match.group(1))
+        elif depth == 1:
+            children[match.group(3)] = int(match.group(1))
+    return total, children
+
+
+def imports_bench(modules: Sequence[str], repeat: int, top: int) -> int:
+    """Median cold-start import time of each entry module, with its most expensive dependencies."""
+    for module in modules:
+        runs = [import_times(module) for _ in range(repeat)]
+        total = statistics.median(run_total for run_total, _ in runs)
+        children = {name: statistics.median(run.get(name, 0) for _, run in runs) for name in runs[0][1]}
+        print(f"{module}: {total / 1000:.1f}ms median over {repeat} runs (interpreter start-up included)")
+        for name, value in sorted(children.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  {name:<40} {value / 1000:>8.1f}ms")
+    return 0
+
+
+def bench(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point of ``python auto_checkin.py bench``."""
+    if argv and argv[0] == "decode":
+        parser = argparse.ArgumentParser(prog="auto_checkin.py bench decode")
+        parser.add_argument("--number", type=int, default=20000)
+        return decode_bench(parser.parse_args(argv[1:]).number)
+    if argv and argv[0] == "imports":
+        parser = argparse.ArgumentParser(prog="auto_checkin.py bench imports")
+        parser.add_argument("--modules", nargs="+", default=["auto_checkin", "ext_minimal"])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--top", type=int, default=8, help="Number of most expensive imports to list")
+        args = parser.parse_args(argv[1:])
+        return imports_bench(args.modules, args.repeat, args.top)
+    if argv and argv[0] == "compare":
+        parser = argparse.ArgumentParser(prog="auto_checkin.py bench compare")
+        parser.add_argument("baseline")
+        parser.add_argument("candidate")
+        parser.add_argument("--threshold", type=float, default=0.1, help="Relative change flagged as regression")
+        args = parser.parse_args(argv[1:])
+        return compare(args.baseline, args.candidate, args.threshold)
+    parser = argparse.ArgumentParser(prog="auto_checkin.py bench")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("CONCURRENCY", "8")))
+    parser.add_argument("--latency", default="fixed:0.02", help="Mock API latency spec, see ext_mock_api")
+    parser.add_argument("--faults", help="Mock API fault profile (flaky, slow-tls, throttled, outage, bad-day or a JSON file)")
+    parser.add_argument("--server-arg", action="append", default=[], help="Extra argument for ext_mock_api.py, e.g. --server-arg=--error-rate=0.01")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return run_bench(parser.parse_args(argv))
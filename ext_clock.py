@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from statistics import median
+from typing import Deque, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+
+
+class ServerClock:
+    """Offset between a server's clock and ours, estimated from the ``Date`` headers of its responses.
+
+    ``Date`` has a resolution of one second, and the server stamped it at some moment
+    between sending the request (``t0``) and receiving the response (``t1``). Each
+    response therefore bounds the offset to ``[D - t1, D + 1 - t0]``. Intersecting the
+    bounds of several responses that hit different points of the server's second
+    narrows the estimate to about one round trip. If the bounds stop overlapping (the
+    server clock stepped, or a load balancer mixes clocks), the oldest samples are
+    dropped until they do; with a single sample left the midpoint is used.
+    """
+
+    def __init__(self, host: Optional[str] = None, max_samples: int = 32):
+        """
+        :param host: Only sample responses from this host (all hosts if None); see also ``watch``.
+        :param max_samples: How many recent responses to keep.
+        """
+        self.hosts = {host} if host else set()
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._estimate: Tuple[float, float] = (0.0, float("inf"))
+
+    def observe(self, sent_at: float, received_at: float, date_header: str):
+        """Add one response, timed with ``time.time()``."""
+        try:
+            server_time = parsedate_to_datetime(date_header).timestamp()
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self._samples.append((server_time - received_at, server_time + 1 - sent_at))
+            self._estimate = self._intersect()
+
+    def _intersect(self) -> Tuple[float, float]:
+        samples = list(self._samples)
+        while samples:
+            low = max(lower for lower, _ in samples)
+            high = min(upper for _, upper in samples)
+            if low <= high:
+                return (low + high) / 2, (high - low) / 2
+            if len(samples) == 1:
+                break
+            samples.pop(0)
+        return median((lower + upper) / 2 for lower, upper in self._samples), 0.5
+
+    def response_hook(self, response: requests.Response, *args, **kwargs):
+        """``requests`` response hook; ``elapsed`` covers sending the request up to parsing the headers."""
+        date_header = response.headers.get("Date")
+        if not date_header or (self.hosts and urlsplit(response.url).hostname not in self.hosts):
+            return
+        received_at = time.time()
+        self.observe(received_at - response.elapsed.total_seconds(), received_at, date_header)
+
+    def watch(self, host: Optional[str]):
+        """Also sample the responses of ``host``."""
+        if host and host not in self.hosts:
+            with self._lock:
+                self.hosts = self.hosts | {host}
+
+    def attach(self, session: requests.Session):
+        """Sample every response of ``session``."""
+        hooks = session.hooks.setdefault("response", [])
+        if self.response_hook not in hooks:
+            hooks.append(self.response_hook)
+
+    @property
+    def samples(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    @property
+    def offset(self) -> float:
+        """Seconds to add to the local clock to get the server's; 0 until a response was seen."""
+        with self._lock:
+            return self._estimate[0]
+
+    @property
+    def uncertainty(self) -> float:
+        """Half-width of the offset estimate in seconds (infinite without samples)."""
+        with self._lock:
+            return self._estimate[1]
+
+    def now(self) -> float:
+        """Server-aligned epoch time."""
+        return time.time() + self.offset
+
+    def log_estimate(self):
+        if self.samples:
+            logger.info(f"Server clock offset {self.offset:+.3f}s ± {self.uncertainty:.3f}s from {self.samples} response(s)")
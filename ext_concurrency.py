@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+
+class AimdController:
+    """An adaptive concurrency limit driven by additive-increase / multiplicative-decrease.
+
+    Every request reports its latency and whether the API accepted it (see ``observe``).
+    Each fast, healthy request grows the limit by ``increase / limit``, i.e. by about
+    ``increase`` per round of ``limit`` requests. An error, throttling response or slow
+    request multiplies it by ``decrease``, at most once per ``cooldown`` seconds so one
+    burst of concurrent failures only counts once. The limit is used like an
+    ``asyncio.Semaphore``: ``async with controller: ...``.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_target: float = 2.0,
+        cooldown: float = 1.0,
+    ):
+        """
+        :param initial: Starting limit.
+        :param min_limit: The limit never drops below this.
+        :param max_limit: The limit never grows above this.
+        :param increase: Additive step per round of successful requests.
+        :param decrease: Factor applied to the limit on congestion.
+        :param latency_target: Requests slower than this (seconds) count as congestion.
+        :param cooldown: Minimum seconds between two decreases.
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeups = set()
+        self.peak_limit = int(self._limit)
+        self.successes = 0
+        self.congestion_signals = 0
+        self.decreases = 0
+
+    @classmethod
+    def from_env(cls, max_limit: int) -> "AimdController":
+        """Build a controller from the AIMD_* environment variables, capped at ``max_limit``."""
+        return cls(
+            initial=int(os.getenv("AIMD_INITIAL", "4")),
+            min_limit=int(os.getenv("AIMD_MIN", "1")),
+            max_limit=max_limit,
+            latency_target=float(os.getenv("AIMD_LATENCY_TARGET", "2")),
+        )
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def observe(self, latency: float, ok: bool):
+        """Feed the outcome of one request. Safe to call from worker threads."""
+        with self._lock:
+            if ok and latency <= self.latency_target:
+                self.successes += 1
+                before = self.limit
+                self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+                grown, loop = self.limit - before, self._loop
+                if grown > 0 and loop is not None and not loop.is_closed():
+                    # Waiters are otherwise only woken when a request finishes.
+                    loop.call_soon_threadsafe(self._wake, grown)
+                return
+            self.congestion_signals += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.decreases += 1
+            self._limit = max(self.min_limit, self._limit * self.decrease)
+            logger.debug("Congestion (latency={:.2f}s, ok={}), concurrency limit -> {}", latency, ok, self.limit)
+
+    def _wake(self, n: int):
+        task = self._loop.create_task(self._notify(n))
+        self._wakeups.add(task)
+        task.add_done_callback(self._wakeups.discard)
+
+    async def _notify(self, n: int):
+        async with self._condition:
+            self._condition.notify(n)
+
+    async def __aenter__(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._loop = asyncio.get_running_loop()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "peak_limit": self.peak_limit,
+                "successes": self.successes,
+                "congestion_signals": self.congestion_signals,
+                "decreases": self.decreases,
+            }
@@ -0,0 +1,361 @@
+"""Resident daemon mode: sign in on an internal schedule instead of one cold process per run.
+
+Run::
+
+    python auto_checkin.py daemon
+
+The process keeps the HTTP pool, the profile cache and the sign ledger between runs.
+Runs follow DAEMON_SCHEDULE (cron expressions in Beijing time), each delayed by a
+random part of DAEMON_JITTER seconds. Shortly before a run the accounts are warmed
+up: uncached roles are looked up and the pool is opened again. TOKEN_FILE is watched
+and re-read when it changes. A small HTTP control endpoint on loopback (or a Unix
+socket) reports the status and triggers runs::
+
+    curl http://127.0.0.1:8765/status
+    curl -X POST http://127.0.0.1:8765/run
+    curl -X POST http://127.0.0.1:8765/reload
+"""
+import json
+import os
+import random
+import signal
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from loguru import logger
+
+BEIJING = ZoneInfo("Asia/Shanghai")
+
+
+class CronSchedule:
+    """A five-field cron expression (minute hour day-of-month month day-of-week).
+
+    Fields accept ``*``, numbers, ranges ``a-b``, lists ``a,b`` and steps ``*/n`` or
+    ``a-b/n``; day-of-week 0 and 7 are Sunday. As in cron, when both day fields are
+    restricted a day matches if either does.
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str, tz: ZoneInfo = BEIJING):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got {len(fields)}: {expression!r}")
+        self.expression = expression
+        self.tz = tz
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = frozenset(day % 7 for day in weekdays)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> FrozenSet[int]:
+        values = set()
+        for part in field.split(","):
+            spec, _, step = part.partition("/")
+            if spec == "*":
+                start, stop = low, high
+            elif "-" in spec:
+                start, stop = map(int, spec.split("-", 1))
+            else:
+                start = stop = int(spec)
+                if step:
+                    stop = high
+            if not low <= start <= stop <= high or (step and int(step) < 1):
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, stop + 1, int(step) if step else 1))
+        return frozenset(values)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute strictly after ``moment``."""
+        candidate = moment.astimezone(self.tz).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=5 * 366)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+def parse_schedules(text: str) -> List[CronSchedule]:
+    """``;``-separated cron expressions."""
+    return [CronSchedule(expression.strip()) for expression in text.split(";") if expression.strip()]
+
+
+def token_source_signature() -> Optional[Tuple[Any, ...]]:
+    """Changes whenever the token list of TOKEN_FILE / TOKEN may have changed."""
+    token_file = os.getenv("TOKEN_FILE")
+    if token_file:
+        try:
+            stat = os.stat(token_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    return ("TOKEN", hash(os.getenv("TOKEN", "")))
+
+
+class Daemon:
+    """Runs ``run`` on schedule or on request, and ``warm`` before runs and after token changes.
+
+    :param run: Signs in every account; returns a summary for the status (``failed`` etc.).
+    :param warm: Looks up profiles and opens connections; returns the number of accounts.
+    :param jitter: Delay every scheduled run by a random 0 to ``jitter`` seconds.
+    :param warm_lead: Warm up this many seconds before a scheduled run.
+    :param reload_interval: Check the token source for changes this often (seconds).
+    """
+
+    def __init__(
+        self,
+        schedules: List[CronSchedule],
+        run: Callable[[], Dict[str, Any]],
+        warm: Callable[[], int],
+        jitter: float = 0.0,
+        warm_lead: float = 60.0,
+        reload_interval: float = 30.0,
+    ):
+        if not schedules:
+            raise ValueError("At least one schedule is required")
+        self.schedules = schedules
+        self.run = run
+        self.warm = warm
+        self.jitter = jitter
+        self.warm_lead = warm_lead
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._run_requested = False
+        self._reload_requested = False
+        self.state = "idle"
+        self.started_at = time.time()
+        self.next_run_at = 0.0
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.accounts: Optional[int] = None
+        self.tokens_changed_at: Optional[float] = None
+        self._signature = token_source_signature()
+        self._warmed_for = 0.0
+
+    @classmethod
+    def from_env(cls, run: Callable[[], Dict[str, Any]], warm: Callable[[], int]) -> "Daemon":
+        """Build a daemon from DAEMON_SCHEDULE / DAEMON_JITTER / DAEMON_WARM_LEAD / DAEMON_RELOAD_INTERVAL."""
+        return cls(
+            schedules=parse_schedules(os.getenv("DAEMON_SCHEDULE", "0 6 * * *")),
+            run=run,
+            warm=warm,
+            jitter=float(os.getenv("DAEMON_JITTER", "0")),
+            warm_lead=float(os.getenv("DAEMON_WARM_LEAD", "60")),
+            reload_interval=float(os.getenv("DAEMON_RELOAD_INTERVAL", "30")),
+        )
+
+    def _schedule_next(self):
+        now = datetime.now(BEIJING)
+        scheduled = min(schedule.next_after(now) for schedule in self.schedules)
+        self.next_run_at = scheduled.timestamp() + random.uniform(0, self.jitter)
+        logger.info(f"Next run at {datetime.fromtimestamp(self.next_run_at, BEIJING):%Y-%m-%d %H:%M:%S} Beijing time")
+
+    def request_run(self) -> bool:
+        """Run as soon as possible; False if a run is already in progress or queued."""
+        with self._lock:
+            if self.state == "running" or self._run_requested:
+                return False
+            self._run_requested = True
+        self._wake.set()
+        return True
+
+    def request_reload(self):
+        with self._lock:
+            self._reload_requested = True
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "uptime": round(time.time() - self.started_at, 1),
+                "schedule": [schedule.expression for schedule in self.schedules],
+                "next_run_at": datetime.fromtimestamp(self.next_run_at, BEIJING).isoformat() if self.next_run_at else None,
+                "run_queued": self._run_requested,
+                "runs": self.runs,
+                "last_run": self.last_run,
+                "accounts": self.accounts,
+                "tokens_changed_at": (
+                    datetime.fromtimestamp(self.tokens_changed_at, BEIJING).isoformat() if self.tokens_changed_at else None
+                ),
+            }
+
+    def _set_state(self, state: str):
+        with self._lock:
+            self.state = state
+
+    def _do_warm(self):
+        self._set_state("warming")
+        try:
+            self.accounts = self.warm()
+        except Exception as e:
+            logger.warning(f"Warm-up failed: {e}")
+        finally:
+            self._set_state("idle")
+
+    def _do_run(self, reason: str):
+        with self._lock:
+            self.state = "running"
+            self._run_requested = False
+        started_at = time.time()
+        logger.info(f"Starting {reason} run")
+        try:
+            summary = self.run()
+        except Exception as e:
+            logger.exception("Run failed")
+            summary = {"error": f"{type(e).__name__}: {e}"}
+        with self._lock:
+            self.runs += 1
+            self.last_run = {
+                "reason": reason,
+                "started_at": datetime.fromtimestamp(started_at, BEIJING).isoformat(),
+                "duration": round(time.time() - started_at, 3),
+                **summary,
+            }
+            self.state = "idle"
+
+    def _check_tokens(self):
+        with self._lock:
+            forced, self._reload_requested = self._reload_requested, False
+        signature = token_source_signature()
+        if signature == self._signature and not forced:
+            return
+        self._signature = signature
+        self.tokens_changed_at = time.time()
+        logger.info("Token list changed, reloading" if not forced else "Reloading the token list")
+        self._do_warm()
+        logger.info(f"{self.accounts} account(s) configured")
+
+    def serve_forever(self):
+        """Schedule runs until ``stop()`` is called."""
+        self._schedule_next()
+        self._do_warm()
+        next_check = time.monotonic() + self.reload_interval
+        while not self._stop.is_set():
+            self._wake.clear()
+            now = time.time()
+            if self._run_requested:
+                self._do_run("requested")
+            elif now >= self.next_run_at:
+                self._do_run("scheduled")
+                self._schedule_next()
+            elif self._reload_requested or time.monotonic() >= next_check:
+                self._check_tokens()
+                next_check = time.monotonic() + self.reload_interval
+            elif now >= self.next_run_at - self.warm_lead and self._warmed_for != self.next_run_at:
+                self._warmed_for = self.next_run_at
+                self._do_warm()
+            else:
+                wake_at = self.next_run_at if self._warmed_for == self.next_run_at else self.next_run_at - self.warm_lead
+                self._wake.wait(max(0.0, min(wake_at - now, next_check - time.monotonic())))
+        logger.info("Daemon stopped")
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    def _reply(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(200, self.server.daemon_instance.status())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        daemon = self.server.daemon_instance
+        if self.path == "/run":
+            if daemon.request_run():
+                self._reply(202, {"queued": True})
+            else:
+                self._reply(409, {"queued": False, "error": "a run is already in progress or queued"})
+        elif self.path == "/reload":
+            daemon.request_reload()
+            self._reply(202, {"reload": True})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args: Any):
+        logger.debug("Control {} - {}", self.address_string(), format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = "localhost", 0
+
+
+def start_control_server(daemon: Daemon, address: str) -> Optional[socketserver.BaseServer]:
+    """Serve the control endpoint on ``host:port`` or ``unix:<path>`` in a background thread; ``off`` disables it."""
+    if not address or address == "off":
+        return None
+    if address.startswith("unix:"):
+        path = address[5:]
+        if os.path.exists(path):
+            os.unlink(path)
+        server = _UnixHTTPServer(path, _ControlHandler)
+        os.chmod(path, 0o600)
+    else:
+        host, _, port = address.rpartition(":")
+        server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), _ControlHandler)
+        server.daemon_threads = True
+    server.daemon_instance = daemon
+    threading.Thread(target=server.serve_forever, name="daemon-control", daemon=True).start()
+    logger.info(f"Control endpoint listening on {address}")
+    return server
+
+
+def serve(run: Callable[[], Dict[str, Any]], warm: Callable[[], int]):
+    """Run the daemon with its control endpoint (DAEMON_CONTROL) until SIGTERM or Ctrl-C."""
+    daemon = Daemon.from_env(run, warm)
+    server = start_control_server(daemon, os.getenv("DAEMON_CONTROL", "127.0.0.1:8765"))
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server, _UnixHTTPServer):
+                os.unlink(server.server_address)
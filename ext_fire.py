@@ -0,0 +1,199 @@
+"""Fire the sign requests right after the daily reset at Beijing midnight.
+
+Before the reset every account's role is looked up (get_mine_info/get_user_game_list)
+into the profile cache, and the shared HTTP pool is opened and kept warm with cheap
+read-only requests. At the reset the normal multi-account run starts; with the
+profiles cached it only sends the sign POSTs, over connections that are already open.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from loguru import logger
+
+from ext_clock import ServerClock
+from ext_stats import percentile
+from ext_storage import ProfileCache
+from ext_tokens import TokenEntry
+
+BEIJING = ZoneInfo("Asia/Shanghai")
+
+Clock = Callable[[], float]
+
+
+def next_reset(now: float) -> float:
+    """Epoch time of the next midnight in Asia/Shanghai after ``now``."""
+    local = datetime.fromtimestamp(now, BEIJING)
+    midnight = datetime(local.year, local.month, local.day, tzinfo=BEIJING) + timedelta(days=1)
+    return midnight.timestamp()
+
+
+async def sleep_until(target: float, clock: Clock = time.time, spin: float = 0.02):
+    """Sleep until ``clock()`` reaches ``target``; the last ``spin`` seconds are spent yielding, not sleeping."""
+    while (remaining := target - clock()) > spin:
+        await asyncio.sleep(remaining - spin)
+    while clock() < target:
+        await asyncio.sleep(0)
+
+
+class ResetFirer:
+    """Prepares accounts ahead of the reset and returns exactly when it happens.
+
+    :param lead: Start the role lookups this many seconds before the reset.
+    :param keepalive: While waiting, send a round of read-only requests every this many
+        seconds so the pooled connections are not closed as idle.
+    :param max_wait: If the next reset is further away than this (e.g. the job started just
+        after midnight), fire immediately instead of waiting a day.
+    :param server_clock: Time the reset by this estimate of the API server's clock instead of
+        the local one. A few requests spread over one second calibrate it before the wait
+        (cut short if the reset is too close).
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        profile_cache: ProfileCache,
+        lead: float = 120.0,
+        keepalive: float = 15.0,
+        max_wait: float = 3600.0,
+        server_clock: Optional[ServerClock] = None,
+        calibration_samples: int = 8,
+    ):
+        self.concurrency = concurrency
+        self.profile_cache = profile_cache
+        self.lead = lead
+        self.keepalive = keepalive
+        self.max_wait = max_wait
+        self.server_clock = server_clock
+        self.clock: Clock = server_clock.now if server_clock else time.time
+        self.calibration_samples = calibration_samples
+        self.reset_at: Optional[float] = None
+
+    @classmethod
+    def from_env(
+        cls, concurrency: int, profile_cache: ProfileCache, server_clock: Optional[ServerClock] = None
+    ) -> "ResetFirer":
+        """Build a firer from FIRE_LEAD / FIRE_KEEPALIVE / FIRE_MAX_WAIT."""
+        return cls(
+            concurrency=concurrency,
+            profile_cache=profile_cache,
+            lead=float(os.getenv("FIRE_LEAD", "120")),
+            keepalive=float(os.getenv("FIRE_KEEPALIVE", "15")),
+            max_wait=float(os.getenv("FIRE_MAX_WAIT", "3600")),
+            server_clock=server_clock,
+        )
+
+    def _client(self, entry: TokenEntry):
+        from auto_checkin import AsyncKurobbsClient
+
+        return AsyncKurobbsClient(entry.token, profile_cache=self.profile_cache)
+
+    async def _lookup_roles(self, entries: Sequence[TokenEntry]):
+        """Fill the profile cache for every account that is not cached yet."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def lookup(entry: TokenEntry):
+            async with semaphore:
+                client = self._client(entry)
+                if client._cached_role_info() is not None:
+                    return
+                try:
+                    await client.get_role_info_async()
+                except Exception as e:
+                    # The account is retried (and reported) by the normal run after the reset.
+                    logger.warning(f"Role lookup before the reset failed: {e}")
+
+        await asyncio.gather(*(lookup(entry) for entry in entries))
+
+    async def _warm(self, entries: Sequence[TokenEntry]):
+        """Open (or keep open) up to ``concurrency`` pooled connections with concurrent read-only requests."""
+        async def ping(entry: TokenEntry):
+            try:
+                await self._client(entry).get_mine_info_async()
+            except Exception as e:
+                logger.debug("Keep-alive request failed: {}", e)
+
+        await asyncio.gather(*(ping(entries[i % len(entries)]) for i in range(self.concurrency)))
+
+    async def _ping(self, entry: TokenEntry):
+        try:
+            await self._client(entry).get_mine_info_async()
+        except Exception as e:
+            logger.debug("Calibration request failed: {}", e)
+
+    async def _calibrate(self, entries: Sequence[TokenEntry], until: float):
+        """Send requests at evenly spread points of the second so the Date-header bounds converge.
+
+        Stops early rather than run past ``until`` (server time).
+        """
+        interval = 1 + 1 / self.calibration_samples
+        for _ in range(self.calibration_samples):
+            if self.clock() + interval > until:
+                break
+            await self._ping(entries[0])
+            await asyncio.sleep(interval)
+        self.server_clock.log_estimate()
+
+    async def warm_up(self, tokens: Iterable[TokenEntry]) -> int:
+        """Fill the profile cache and open the pool right away, without waiting for a reset.
+
+        :return: The number of accounts.
+        """
+        entries = [entry for entry in tokens if entry.token]
+        if entries:
+            await self._lookup_roles(entries)
+            await self._warm(entries)
+        return len(entries)
+
+    async def prepare(self, tokens: Iterable[TokenEntry]) -> float:
+        """Look up roles and warm the pool ahead of the reset, then return at the reset.
+
+        :return: The epoch time the run fired at.
+        """
+        entries = [entry for entry in tokens if entry.token]
+        if self.server_clock and entries and not self.server_clock.samples:
+            # A first, coarse offset so the reset is computed by the server's clock.
+            await self._ping(entries[0])
+        now = self.clock()
+        reset_at = next_reset(now)
+        if reset_at - now > self.max_wait:
+            logger.warning(f"Next reset is {reset_at - now:.0f}s away, firing immediately")
+            self.reset_at = now
+            return now
+        logger.info(f"Firing at {datetime.fromtimestamp(reset_at, BEIJING):%Y-%m-%d %H:%M:%S} Beijing time, "
+                    f"in {reset_at - now:.1f}s")
+        if self.server_clock and entries:
+            await self._calibrate(entries, until=reset_at - 2.0)
+        await sleep_until(reset_at - self.lead, self.clock)
+        started = time.perf_counter()
+        await self._lookup_roles(entries)
+        logger.info(f"Prepared {len(entries)} account(s) in {time.perf_counter() - started:.2f}s")
+        # The last round lands about two seconds before the reset.
+        while entries:
+            await self._warm(entries)
+            if self.clock() >= reset_at - 2.0:
+                break
+            await sleep_until(min(self.clock() + self.keepalive, reset_at - 2.0), self.clock)
+        await sleep_until(reset_at, self.clock)
+        self.reset_at = reset_at
+        return reset_at
+
+    def window(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """When the accounts of a fired run finished, in ms after the reset (see ResultsWriter records)."""
+        # finished_at is local time, reset_at server time
+        clock_offset = self.server_clock.offset if self.server_clock else 0.0
+        offsets = sorted(
+            1000 * (record["finished_at"] + clock_offset - self.reset_at) for record in records if "finished_at" in record
+        )
+        if not offsets:
+            return {"accounts": 0}
+        return {
+            "accounts": len(offsets),
+            "first_ms": round(offsets[0], 1),
+            "p50_ms": round(percentile(offsets, 50), 1),
+            "p95_ms": round(percentile(offsets, 95), 1),
+            "last_ms": round(offsets[-1], 1),
+        }
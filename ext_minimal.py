@@ -0,0 +1,175 @@
+"""Stdlib-only check-in for small account lists, where interpreter start-up dominates the run.
+
+It performs the same four Kurobbs calls as KurobbsClient with ``http.client`` and
+``json`` only; pydantic and requests are never imported. The notification
+channels (and loguru) are only loaded after the accounts are done.
+
+Run::
+
+    TOKEN="t1;t2" python ext_minimal.py
+"""
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+from zoneinfo import ZoneInfo
+
+from ext_tokens import TokenEntry, tokens_from_env
+
+logger = logging.getLogger("kurobbs.minimal")
+
+MINE_PATH = "/user/mineV2"
+ROLE_LIST_PATH = "/gamer/role/default"
+SIGN_PATH = "/encourage/signIn/v2"
+USER_SIGN_PATH = "/user/signIn"
+
+# Kept in sync with KurobbsClient.get_headers(), minus accept-encoding: http.client does not decompress.
+BASE_HEADERS = {
+    "osversion": "Android",
+    "devcode": "2fba3859fe9bfe9099f2696b8648c2c6",
+    "countrycode": "CN",
+    "ip": "10.0.2.233",
+    "model": "2211133C",
+    "source": "android",
+    "lang": "zh-Hans",
+    "version": "1.0.9",
+    "versioncode": "1090",
+    "content-type": "application/x-www-form-urlencoded; charset=utf-8",
+    "user-agent": "okhttp/3.10.0",
+}
+
+
+class MinimalClientError(Exception):
+    pass
+
+
+class MinimalClient:
+    """One keep-alive connection per worker thread to the API host."""
+
+    def __init__(self, api_base: str, timeout: float):
+        parts = urlsplit(api_base)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = cls(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def post(self, token: str, path: str, form: Dict[str, Any]) -> Dict[str, Any]:
+        body = urlencode({key: value for key, value in form.items() if value is not None})
+        headers = {**BASE_HEADERS, "token": token}
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            raise MinimalClientError(f"Invalid response from {path} (HTTP {response.status})") from None
+        logger.debug("%s -> code=%s msg=%s", path, payload.get("code"), payload.get("msg"))
+        return payload
+
+    def checkin(self, token: str) -> Dict[str, Any]:
+        mine = self.post(token, MINE_PATH, {"type": 1}).get("data") or {}
+        user_id = mine.get("mine", {}).get("userId", 0)
+        roles = self.post(token, ROLE_LIST_PATH, {"queryUserId": user_id}).get("data") or {}
+        role_list = roles.get("defaultRoleList") or []
+        if not role_list:
+            raise MinimalClientError("No default role found")
+        role_info = role_list[0]
+        beijing_time = datetime.now(ZoneInfo("Asia/Shanghai"))
+        return self.post(token, SIGN_PATH, {
+            "gameId": role_info.get("gameId", 2),
+            "serverId": role_info.get("serverId", None),
+            "roleId": role_info.get("roleId", 0),
+            "userId": role_info.get("userId", 0),
+            "reqMonth": f"{beijing_time.month:02d}",
+        })
+
+    def sign_in(self, token: str) -> Dict[str, Any]:
+        return self.post(token, USER_SIGN_PATH, {"gameId": 2})
+
+
+def run_account(client: MinimalClient, i: int, entry: TokenEntry) -> Tuple[str, bool]:
+    """Sign one account; returns its message in the same format as auto_checkin.main()."""
+    name = f"Account {i} ({entry.label})" if entry.label else f"Account {i}"
+    done, errors = [], []
+    try:
+        for method, success_message, failure_message in (
+            (client.checkin, "签到奖励签到成功", "签到奖励签到失败"),
+            (client.sign_in, "社区签到成功", "社区签到失败"),
+        ):
+            payload = method(entry.token)
+            if payload.get("success"):
+                done.append(success_message)
+            else:
+                errors.append(f"{failure_message}, {payload.get('msg')}")
+    except Exception as e:
+        logger.exception("An unexpected error occurred for %s", name)
+        return f"{name}: Unexpected error - {e}", True
+    if errors:
+        return f"{name}: Error - {'; '.join(errors)}", True
+    logger.info("%s!", ", ".join(done))
+    return f"{name}: {', '.join(done)}!", False
+
+
+def notification_configured() -> bool:
+    """Whether any channel of ext_notification is configured; imports it (and loguru) on first use."""
+    from ext_notification import BACKENDS
+
+    return any(backend.configured() for backend in BACKENDS)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(
+        level=logging.DEBUG if os.getenv("DEBUG", "").lower() in ("1", "true", "yes") else logging.INFO,
+        format="%(asctime)s | %(levelname)-8s | %(message)s",
+        stream=sys.stdout,
+    )
+    tokens = tokens_from_env()
+    if tokens is None:
+        logger.error("Neither TOKEN nor TOKEN_FILE environment variable is set.")
+        return 1
+    client = MinimalClient(
+        os.getenv("KUROBBS_API_BASE", "https://api.kurobbs.com"),
+        timeout=float(os.getenv("HTTP_READ_TIMEOUT", "15")),
+    )
+    jobs = []
+    for i, entry in enumerate(tokens, start=1):
+        if not entry.token:
+            logger.warning("Empty token found at position %s", i)
+            continue
+        jobs.append((i, entry))
+    concurrency = max(1, int(os.getenv("CONCURRENCY", "8")))
+    with ThreadPoolExecutor(max_workers=min(concurrency, max(1, len(jobs)))) as executor:
+        results = list(executor.map(lambda job: run_account(client, *job), jobs))
+    messages = [message for message, _ in results]
+    if messages and notification_configured():
+        from ext_notification import send_notification
+
+        send_notification("\n".join(messages))
+    return 1 if any(failed for _, failed in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""A local stand-in for api.kurobbs.com, for offline benchmarks and tests.
+
+Standalone::
+
+    python ext_mock_api.py --port 8000 --latency lognormal:0.08:0.4 --error-rate 0.01
+    python ext_mock_api.py --port 8000 --faults bad-day        # or a JSON file of FaultRule dicts
+    KUROBBS_API_BASE=http://127.0.0.1:8000 TOKEN="t1;t2" python auto_checkin.py
+
+As a fixture::
+
+    with MockKurobbsServer(latency="fixed:0.01") as server:
+        KurobbsClient("t1", api_base=server.url).start()
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo
+
+ENDPOINTS = ("/user/mineV2", "/gamer/role/default", "/encourage/signIn/v2", "/user/signIn")
+
+
+def parse_latency(spec: Union[str, float, None]) -> Callable[[], float]:
+    """Turn a latency spec into a sampler returning seconds.
+
+    Supported: ``fixed:S``, ``uniform:LOW:HIGH``, ``normal:MEAN:STD``, ``lognormal:MEDIAN:SIGMA``
+    or a plain number (fixed).
+    """
+    if spec is None:
+        return lambda: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind, *args = spec.split(":")
+    values = [float(arg) for arg in args]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    try:
+        value = float(kind)
+    except ValueError:
+        raise ValueError(f"Unknown latency spec: {spec}") from None
+    return lambda: value
+
+
+class FaultRule:
+    """One scripted failure mode of the mock API.
+
+    Kinds:
+
+    - ``latency_spike``: add ``delay`` seconds before answering.
+    - ``slow_connect``: add ``delay`` seconds to the first request of each connection (a slow handshake).
+    - ``http_502``: answer with a 502 HTML error page.
+    - ``rate_limit``: answer HTTP 200 with a ``code != 200`` throttling payload.
+    - ``truncated``: cut the JSON body in half (breaks ``Response.model_validate_json``).
+    - ``reset``: drop the connection with a TCP RST and no response.
+
+    A rule applies with ``probability`` to the listed ``endpoints`` (all if empty). With
+    ``start``/``duration`` it is only active in that window (seconds after server start),
+    repeated every ``period`` seconds if given, which scripts error bursts.
+    """
+
+    KINDS = ("latency_spike", "slow_connect", "http_502", "rate_limit", "truncated", "reset")
+
+    def __init__(
+        self,
+        kind: str,
+        probability: float = 1.0,
+        endpoints: Sequence[str] = (),
+        delay: float = 0.0,
+        start: float = 0.0,
+        duration: Optional[float] = None,
+        period: Optional[float] = None,
+    ):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown fault kind {kind}, expected one of {self.KINDS}")
+        self.kind = kind
+        self.probability = probability
+        self.endpoints = tuple(endpoints)
+        self.delay = delay
+        self.start = start
+        self.duration = duration
+        self.period = period
+
+    def applies(self, path: str, elapsed: float) -> bool:
+        """Whether the rule fires for a request to ``path`` ``elapsed`` seconds after server start."""
+        if self.endpoints and path not in self.endpoints:
+            return False
+        if elapsed < self.start:
+            return False
+        offset = elapsed - self.start
+        if self.period:
+            offset %= self.period
+        if self.duration is not None and offset >= self.duration:
+            return False
+        return random.random() < self.probability
+
+
+SIGN_ENDPOINTS = ("/encourage/signIn/v2", "/user/signIn")
+
+# Named fault profiles for --faults; each is a list of FaultRule keyword arguments.
+FAULT_PROFILES: Dict[str, List[Dict[str, Any]]] = {
+    "flaky": [
+        {"kind": "http_502", "probability": 0.05},
+        {"kind": "truncated", "probability": 0.02},
+        {"kind": "reset", "probability": 0.01},
+    ],
+    "slow-tls": [
+        {"kind": "slow_connect", "delay": 0.3},
+        {"kind": "latency_spike", "probability": 0.05, "delay": 1.0},
+    ],
+    "throttled": [
+        {"kind": "rate_limit", "probability": 0.3, "endpoints": SIGN_ENDPOINTS},
+    ],
+    "outage": [
+        {"kind": "http_502", "start": 0.0, "duration": 5.0},
+    ],
+    "bad-day": [
+        {"kind": "slow_connect", "delay": 0.2},
+        {"kind": "latency_spike", "probability": 0.05, "delay": 2.0},
+        {"kind": "http_502", "probability": 0.5, "start": 2.0, "duration": 1.0, "period": 10.0},
+        {"kind": "rate_limit", "probability": 0.2, "endpoints": SIGN_ENDPOINTS},
+        {"kind": "truncated", "probability": 0.02},
+        {"kind": "reset", "probability": 0.01},
+    ],
+}
+
+
+def load_fault_profile(spec: Union[str, Sequence[Dict[str, Any]], None]) -> List[FaultRule]:
+    """Load fault rules from a profile name, a JSON file (a list of rule dicts) or a list of dicts."""
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        if spec in FAULT_PROFILES:
+            spec = FAULT_PROFILES[spec]
+        else:
+            spec = json.loads(Path(spec).read_text(encoding="utf-8"))
+    return [FaultRule(**rule) for rule in spec]
+
+
+class AccountState:
+    """Server-side state of one token: stable ids and the days it already signed."""
+
+    def __init__(self, token: str):
+        digest = int(hashlib.sha256(token.encode("utf-8")).hexdigest()[:12], 16)
+        self.user_id = 10_000_000 + digest % 90_000_000
+        self.role_id = str(100_000_000 + digest % 900_000_000)
+        self.server_id = "76402e5b20be2c39f095a152090afddc"
+        self.checkin_days = set()
+        self.sign_in_days = set()
+
+
+class MockKurobbsServer:
+    """A threaded HTTP server implementing the four endpoints auto_checkin.py uses.
+
+    Tokens starting with ``invalid`` are rejected as expired. Every other token gets a
+    stable userId/roleId, and signing twice on the same Beijing day is refused like the
+    real API does.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: Union[str, float, None] = None,
+        endpoint_latency: Optional[Dict[str, Union[str, float]]] = None,
+        error_rate: float = 0.0,
+        faults: Union[str, Sequence[Dict[str, Any]], None] = None,
+        clock_skew: float = 0.0,
+    ):
+        """
+        :param port: 0 picks a free port; see ``url``.
+        :param latency: Default latency spec for every endpoint (see ``parse_latency``).
+        :param endpoint_latency: Per-endpoint latency specs overriding the default.
+        :param error_rate: Fraction of requests answered with a ``code=500`` error payload.
+        :param faults: A fault profile name, JSON file path or list of FaultRule dicts (see ``load_fault_profile``).
+        :param clock_skew: Seconds the server clock (Date header and day boundary) runs ahead of the local one.
+        """
+        self.default_latency = parse_latency(latency)
+        self.endpoint_latency = {path: parse_latency(spec) for path, spec in (endpoint_latency or {}).items()}
+        self.error_rate = error_rate
+        self.faults = load_fault_profile(faults)
+        self.faults_injected = Counter()
+        self.clock_skew = clock_skew
+        self.started_at = time.monotonic()
+        self.accounts: Dict[str, AccountState] = {}
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockKurobbsServer":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-kurobbs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockKurobbsServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "faults": dict(self.faults_injected)}
+
+    def pick_faults(self, path: str) -> List[FaultRule]:
+        """The fault rules firing for one request to ``path``."""
+        elapsed = time.monotonic() - self.started_at
+        fired = [rule for rule in self.faults if rule.applies(path, elapsed)]
+        if fired:
+            with self._lock:
+                self.faults_injected.update(rule.kind for rule in fired)
+        return fired
+
+    def account(self, token: str) -> AccountState:
+        with self._lock:
+            if token not in self.accounts:
+                self.accounts[token] = AccountState(token)
+            return self.accounts[token]
+
+    def now(self) -> float:
+        return time.time() + self.clock_skew
+
+    def latency(self, path: str) -> float:
+        return self.endpoint_latency.get(path, self.default_latency)()
+
+    def handle(self, path: str, token: str, form: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Compute the (HTTP status, JSON payload) answering one request."""
+        with self._lock:
+            self.requests[path] += 1
+        if path not in ENDPOINTS:
+            return 404, {"code": 404, "msg": "接口不存在", "success": False}
+        if self.error_rate and random.random() < self.error_rate:
+            return 200, {"code": 500, "msg": "系统繁忙", "success": False}
+        if not token or token.startswith("invalid"):
+            return 200, {"code": 220, "msg": "登录已过期，请重新登录", "success": False}
+        account = self.account(token)
+        today = datetime.fromtimestamp(self.now(), ZoneInfo("Asia/Shanghai")).date()
+        if path == "/user/mineV2":
+            return 200, ok({"mine": {"userId": account.user_id, "userName": f"user{account.user_id}"}})
+        if path == "/gamer/role/default":
+            role = {
+                "gameId": 2,
+                "serverId": account.server_id,
+                "roleId": account.role_id,
+                "userId": account.user_id,
+                "roleName": f"漂泊者{account.role_id[-4:]}",
+            }
+            return 200, ok({"defaultRoleList": [role]})
+        if path == "/encourage/signIn/v2":
+            if form.get("roleId") != account.role_id or form.get("userId") != str(account.user_id):
+                return 200, {"code": 1513, "msg": "角色信息不匹配", "success": False}
+            if not self._mark_signed(account.checkin_days, today):
+                return 200, {"code": 1511, "msg": "请勿重复签到", "success": False}
+            return 200, ok({"todayList": [{"goodsName": "星声", "goodsNum": 50}], "tomorrowList": []})
+        if not self._mark_signed(account.sign_in_days, today):
+            return 200, {"code": 1511, "msg": "请勿重复签到", "success": False}
+        return 200, ok({"gainVoList": [{"gainTyp": 1, "gainValue": 10}], "continueDays": len(account.sign_in_days)})
+
+    def _mark_signed(self, days: set, today) -> bool:
+        """Record a sign for ``today``; False if it was already signed."""
+        with self._lock:
+            if today in days:
+                return False
+            days.add(today)
+            return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are written separately
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(length).decode("utf-8")
+                form = {key: values[0] for key, values in parse_qs(body).items()}
+                faults = server.pick_faults(self.path)
+                delay = server.latency(self.path)
+                for rule in faults:
+                    if rule.kind == "latency_spike" or (rule.kind == "slow_connect" and not self.handled_before):
+                        delay += rule.delay
+                self.handled_before = True
+                time.sleep(delay)
+                failure = next((rule.kind for rule in faults if rule.kind not in ("latency_spike", "slow_connect")), None)
+                if failure == "reset":
+                    self.reset_connection()
+                elif failure == "http_502":
+                    self.send_body(502, b"<html><body><h1>502 Bad Gateway</h1></body></html>", "text/html")
+                elif failure == "rate_limit":
+                    self.send_json(200, {"code": 1005, "msg": "请求过于频繁，请稍后再试", "success": False})
+                else:
+                    status, payload = server.handle(self.path, self.headers.get("token", ""), form)
+                    self.send_json(status, payload, truncate=failure == "truncated")
+
+            handled_before = False
+
+            def date_time_string(self, timestamp=None):
+                return super().date_time_string(server.now() if timestamp is None else timestamp)
+
+            def send_json(self, status: int, payload: Dict[str, Any], truncate: bool = False):
+                content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                if truncate:
+                    content = content[: len(content) // 2]
+                self.send_body(status, content, "application/json;charset=UTF-8")
+
+            def send_body(self, status: int, content: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("content-type", content_type)
+                self.send_header("content-length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def reset_connection(self):
+                """Abort the connection with RST instead of a FIN."""
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                self.close_connection = True
+                self.connection.close()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def ok(data: Any) -> Dict[str, Any]:
+    return {"code": 200, "msg": "请求成功", "success": True, "data": data}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Kurobbs API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", default=None, help="e.g. fixed:0.05, uniform:0.02:0.2, lognormal:0.08:0.4")
+    parser.add_argument(
+        "--endpoint-latency",
+        action="append",
+        default=[],
+        metavar="PATH=SPEC",
+        help="Per-endpoint latency, e.g. /encourage/signIn/v2=fixed:0.3",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--faults",
+        default=None,
+        help=f"Fault profile: one of {', '.join(FAULT_PROFILES)} or a JSON file with a list of FaultRule dicts",
+    )
+    parser.add_argument("--clock-skew", type=float, default=0.0, help="Seconds the server clock runs ahead (negative: behind)")
+    args = parser.parse_args()
+    endpoint_latency = dict(item.split("=", 1) for item in args.endpoint_latency)
+    server = MockKurobbsServer(
+        args.host, args.port, args.latency, endpoint_latency, args.error_rate, args.faults, args.clock_skew
+    )
+    print(f"Mock Kurobbs API listening on {server.url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
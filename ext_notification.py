@@ -1,37 +1,403 @@
 import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
 
-import requests
 from loguru import logger
-from serverchan_sdk import sc_send
 
+from ext_storage import dump_json, load_json
 
-def send_notification(message):
-    title = "库街区自动签到任务"
-    send_bark_notification(title, message)
-    send_server3_notification(title, message)
+TITLE = "库街区自动签到任务"
+
+
+class NotificationBackend(ABC):
+    """One notification channel.
+
+    Subclasses implement ``configured`` (read from the environment) and ``send``, which
+    raises on failure. ``send_notification`` runs every configured backend concurrently
+    and gives each at most ``timeout`` seconds, so adding a channel adds no serial latency.
+    """
+
+    name = "backend"
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout if timeout is not None else float(os.getenv("NOTIFY_TIMEOUT", "10"))
+
+    @abstractmethod
+    def configured(self) -> bool:
+        """Whether the channel's settings are present."""
+
+    @abstractmethod
+    def send(self, title: str, message: str):
+        """Deliver one message; raises on failure."""
+
+
+class BarkBackend(NotificationBackend):
+    name = "bark"
+
+    def configured(self) -> bool:
+        return bool(os.getenv("BARK_DEVICE_KEY") and os.getenv("BARK_SERVER_URL"))
+
+    def send(self, title: str, message: str):
+        from ext_transport import get_default_transport
+
+        # 构造 Bark API URL
+        url = f"{os.getenv('BARK_SERVER_URL')}/{os.getenv('BARK_DEVICE_KEY')}/{quote(title, safe='')}/{quote(message, safe='')}"
+        get_default_transport().get(url, timeout=self.timeout).raise_for_status()
+
+
+class ServerChanBackend(NotificationBackend):
+    name = "server3"
+
+    def configured(self) -> bool:
+        return bool(os.getenv("SERVER3_SEND_KEY"))
+
+    def send(self, title: str, message: str):
+        from serverchan_sdk import sc_send  # only load the SDK when it is actually used
+
+        response = sc_send(os.getenv("SERVER3_SEND_KEY"), title, message, {"tags": "Github Action|库街区"})
+        logger.debug(response)
+        if isinstance(response, dict) and response.get("code") not in (0, None):
+            raise RuntimeError(f"ServerChan error: {response.get('message') or response}")
+
+
+class WebhookBackend(NotificationBackend):
+    """POSTs ``{"title": ..., "message": ...}`` as JSON to NOTIFY_WEBHOOK_URL."""
+
+    name = "webhook"
+
+    def configured(self) -> bool:
+        return bool(os.getenv("NOTIFY_WEBHOOK_URL"))
+
+    def send(self, title: str, message: str):
+        from ext_transport import get_default_transport
+
+        response = get_default_transport().post(
+            os.getenv("NOTIFY_WEBHOOK_URL"), json={"title": title, "message": message}, timeout=self.timeout
+        )
+        response.raise_for_status()
+
+
+class SmtpBackend(NotificationBackend):
+    """Mails the report via SMTP_HOST[:SMTP_PORT] from SMTP_FROM to SMTP_TO (comma separated).
+
+    Logs in with SMTP_USER / SMTP_PASSWORD if set and upgrades with STARTTLS if SMTP_STARTTLS is true.
+    """
+
+    name = "smtp"
+
+    def configured(self) -> bool:
+        return bool(os.getenv("SMTP_HOST") and os.getenv("SMTP_TO"))
+
+    def send(self, title: str, message: str):
+        import smtplib
+        from email.message import EmailMessage
+
+        mail = EmailMessage()
+        mail["Subject"] = title
+        mail["From"] = os.getenv("SMTP_FROM", "kurobbs-auto-checkin@localhost")
+        mail["To"] = os.getenv("SMTP_TO")
+        mail.set_content(message)
+        with smtplib.SMTP(os.getenv("SMTP_HOST"), int(os.getenv("SMTP_PORT", "25")), timeout=self.timeout) as smtp:
+            if os.getenv("SMTP_STARTTLS", "").lower() in ("1", "true", "yes"):
+                smtp.starttls()
+            if os.getenv("SMTP_USER"):
+                smtp.login(os.getenv("SMTP_USER"), os.getenv("SMTP_PASSWORD", ""))
+            smtp.send_message(mail)
+
+
+BACKENDS: List[NotificationBackend] = [BarkBackend(), ServerChanBackend(), WebhookBackend(), SmtpBackend()]
+
+
+def register_backend(backend: NotificationBackend):
+    """Add a channel to every following ``send_notification`` call."""
+    BACKENDS.append(backend)
+
+
+def describe_failure(e: BaseException) -> str:
+    """The exception class and HTTP status of a failed delivery, safe for public logs.
+
+    Exception texts are left out: a requests error quotes the full URL, which for Bark
+    contains the device key and the message.
+    """
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return f"{type(e).__name__} (HTTP {status})" if status else type(e).__name__
+
+
+def send_notification(message, backends: Optional[Iterable[NotificationBackend]] = None) -> Dict[str, bool]:
+    """Send ``message`` through every configured channel at once.
+
+    Each channel runs in a daemon thread and is given up on after its ``timeout``, so a
+    hung provider can neither stall the job nor keep the interpreter from exiting.
+
+    :return: Channel name -> whether it was delivered.
+    """
+    backends = [backend for backend in (BACKENDS if backends is None else backends) if backend.configured()]
+    if not backends:
+        logger.debug("No notification channel is configured. Skipping notification.")
+        return {}
+    outcomes: Dict[str, bool] = {}
+
+    def deliver(backend: NotificationBackend):
+        started = time.perf_counter()
+        try:
+            backend.send(TITLE, message)
+            outcomes[backend.name] = True
+            logger.debug("Notification sent via {} in {:.2f}s", backend.name, time.perf_counter() - started)
+        except Exception as e:
+            outcomes[backend.name] = False
+            logger.warning(f"Notification via {backend.name} failed: {describe_failure(e)}")
+
+    threads = []
+    for backend in backends:
+        thread = threading.Thread(target=deliver, args=(backend,), name=f"notify-{backend.name}", daemon=True)
+        thread.start()
+        threads.append((backend, thread, time.monotonic() + backend.timeout))
+    for backend, thread, deadline in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            logger.warning(f"Notification via {backend.name} timed out after {backend.timeout}s")
+            outcomes.setdefault(backend.name, False)
+    return outcomes
+
+
+class NotificationOutbox:
+    """On-disk queue of reports that still have to reach some channel.
+
+    ``put`` persists a report before anything is sent; a background worker then
+    delivers it to each configured channel, retrying failed channels with exponential
+    backoff. Whatever is still undelivered when the process exits stays in the file
+    and is retried by the next run's worker as soon as it ``start``s. All reports
+    pending for a channel go out as one message, oldest first, so an outage produces
+    one catch-up message instead of a burst.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        backends: Optional[List[NotificationBackend]] = None,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_items: int = 10,
+        max_age: float = 7 * 24 * 3600,
+    ):
+        from ext_retry import RetryPolicy
+
+        self.path = Path(path)
+        self.backends = BACKENDS if backends is None else backends
+        self.backoff = RetryPolicy(base_delay=base_delay, max_delay=max_delay).backoff
+        self.max_items = max_items
+        self.max_age = max_age
+        self._condition = threading.Condition()
+        self._items: List[Dict[str, Any]] = load_json(self.path, [])
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self._sending = False
+        self._prune()
+
+    @classmethod
+    def from_env(cls) -> "NotificationOutbox":
+        """Build an outbox from NOTIFY_OUTBOX_PATH / NOTIFY_OUTBOX_MAX_ITEMS."""
+        return cls(
+            path=Path(os.getenv("NOTIFY_OUTBOX_PATH", ".cache/notify_outbox.json")),
+            max_items=int(os.getenv("NOTIFY_OUTBOX_MAX_ITEMS", "10")),
+        )
+
+    def _prune(self):
+        """Drop expired reports, channels that are no longer configured and reports beyond ``max_items``."""
+        configured = {backend.name for backend in self.backends if backend.configured()}
+        now = time.time()
+        items = []
+        for item in self._items:
+            item["channels"] = [name for name in item.get("channels", []) if name in configured]
+            if item["channels"] and now - item.get("created_at", 0) <= self.max_age:
+                items.append(item)
+        if len(items) > self.max_items:
+            logger.warning(f"Notification outbox is full, dropping {len(items) - self.max_items} oldest report(s)")
+            items = items[-self.max_items:]
+        self._items = items
+
+    def _save(self):
+        dump_json(self.path, self._items)
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._items)
+
+    def put(self, message: str):
+        """Persist a report for every configured channel and wake the worker."""
+        channels = [backend.name for backend in self.backends if backend.configured()]
+        if not channels:
+            logger.debug("No notification channel is configured. Skipping notification.")
+            return
+        with self._condition:
+            self._items.append({"id": uuid.uuid4().hex, "created_at": time.time(), "message": message, "channels": channels})
+            self._prune()
+            self._save()
+            self._condition.notify_all()
+        self.start()
+
+    def start(self):
+        """Start the delivery worker, e.g. right at start-up to retry the previous run's reports."""
+        with self._condition:
+            if self._worker is None and self._items:
+                self._stopping = False
+                self._worker = threading.Thread(target=self._run, name="notify-outbox", daemon=True)
+                self._worker.start()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for the outbox to empty, then stop the worker.
+
+        :return: Whether everything was delivered; the rest stays on disk for the next run.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._condition.wait_for(lambda: not self._items or self._worker is None, max(0.0, timeout))
+            self._stopping = True
+            self._condition.notify_all()
+            # A send in progress gets the rest of the timeout; its outcome is still recorded.
+            self._condition.wait_for(lambda: not self._sending, max(0.0, deadline - time.monotonic()))
+            if self._items:
+                logger.warning(f"{len(self._items)} notification(s) undelivered, will retry on the next run")
+            return not self._items
+
+    @staticmethod
+    def _coalesce(items: List[Dict[str, Any]]) -> str:
+        if len(items) == 1:
+            return items[0]["message"]
+        parts = []
+        for item in items:
+            created_at = datetime.fromtimestamp(item["created_at"], ZoneInfo("Asia/Shanghai"))
+            parts.append(f"[{created_at:%Y-%m-%d %H:%M}]\n{item['message']}")
+        return "\n\n".join(parts)
+
+    def _deliver_once(self) -> bool:
+        """Send every channel its pending reports once; returns whether all of them were delivered."""
+        with self._condition:
+            by_channel: Dict[str, List[Dict[str, Any]]] = {}
+            for item in self._items:
+                for name in item["channels"]:
+                    by_channel.setdefault(name, []).append(item)
+            self._sending = True
+        try:
+            # Channels waiting for the same reports share one concurrent send_notification() call.
+            groups: Dict[tuple, List[NotificationBackend]] = {}
+            for backend in self.backends:
+                if backend.name in by_channel:
+                    groups.setdefault(tuple(item["id"] for item in by_channel[backend.name]), []).append(backend)
+            delivered: Dict[str, bool] = {}
+            for backends in groups.values():
+                delivered.update(send_notification(self._coalesce(by_channel[backends[0].name]), backends))
+        finally:
+            with self._condition:
+                self._sending = False
+                self._condition.notify_all()
+        with self._condition:
+            for name, ok in delivered.items():
+                if not ok:
+                    continue
+                sent_ids = {item["id"] for item in by_channel[name]}
+                for item in self._items:
+                    if item["id"] in sent_ids and name in item["channels"]:
+                        item["channels"].remove(name)
+            self._items = [item for item in self._items if item["channels"]]
+            self._save()
+            self._condition.notify_all()
+            return not self._items
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._items or self._stopping)
+                if self._stopping:
+                    self._worker = None
+                    self._condition.notify_all()
+                    return
+            if self._deliver_once():
+                failures = 0
+                continue
+            failures += 1
+            delay = self.backoff(failures)
+            logger.debug("Notification delivery failed, retrying in {:.1f}s", delay)
+            with self._condition:
+                pending = len(self._items)
+                # A new report or drain() wakes the worker early.
+                self._condition.wait_for(lambda: self._stopping or len(self._items) != pending, delay)
 
 
 def send_bark_notification(title, message):
     """Send a notification via Bark."""
-    bark_device_key = os.getenv("BARK_DEVICE_KEY")
-    bark_server_url = os.getenv("BARK_SERVER_URL")
-
-    if not bark_device_key or not bark_server_url:
+    backend = BarkBackend()
+    if not backend.configured():
         logger.debug("Bark secrets are not set. Skipping notification.")
         return
-
-    # 构造 Bark API URL
-    url = f"{bark_server_url}/{bark_device_key}/{title}/{message}"
     try:
-        requests.get(url)
+        backend.send(title, message)
     except Exception:
         pass
 
 
 def send_server3_notification(title, message):
-    server3_send_key = os.getenv("SERVER3_SEND_KEY")
-    if server3_send_key:
-        response = sc_send(server3_send_key, title, message, {"tags": "Github Action|库街区"})
-        logger.debug(response)
+    backend = ServerChanBackend()
+    if backend.configured():
+        backend.send(title, message)
     else:
         logger.debug("ServerChan3 send key not exists.")
+
+
+def build_digest(
+    records: Iterable[Dict[str, Any]],
+    duration: float,
+    details_path: Optional[str] = None,
+    max_groups: int = 10,
+    max_labels: int = 5,
+    max_tracked_groups: int = 100,
+) -> str:
+    """Summarize a run's result records (see ext_storage.ResultsWriter) in a message of bounded size.
+
+    Counts accounts per outcome and groups failures by error message, naming at most
+    ``max_labels`` accounts per group. Only ``max_tracked_groups`` distinct messages
+    are tracked; further ones are counted as "other errors", so the cost of building
+    and sending the digest does not grow with the number of accounts.
+    """
+    total = 0
+    outcomes = {"success": 0, "skipped": 0, "failed": 0, "deferred": 0}
+    groups: Dict[str, List[Any]] = {}  # error message -> [count, labels]
+    for record in records:
+        total += 1
+        if record.get("ok"):
+            actions = record.get("actions") or {}
+            outcomes["skipped" if actions and all(v == "skipped" for v in actions.values()) else "success"] += 1
+            continue
+        deferred = "Deferred" in (record.get("message") or "")
+        outcomes["deferred" if deferred else "failed"] += 1
+        error = "Deferred - run deadline reached" if deferred else record.get("error_message") or record.get("error") or "unknown"
+        if error not in groups and len(groups) >= max_tracked_groups:
+            error = "other errors"
+        group = groups.setdefault(error, [0, []])
+        group[0] += 1
+        if len(group[1]) < max_labels:
+            group[1].append(record.get("label") or f"#{record.get('position')}")
+
+    throughput = total / duration if duration > 0 else 0.0
+    lines = [
+        f"Accounts: {total} in {duration:.1f}s ({throughput:.1f} accounts/s)",
+        ", ".join(f"{name}: {count}" for name, count in outcomes.items()),
+    ]
+    if groups:
+        lines.append("Failures:")
+        for error, (count, labels) in sorted(groups.items(), key=lambda item: item[1][0], reverse=True)[:max_groups]:
+            more = f" +{count - len(labels)} more" if count > len(labels) else ""
+            lines.append(f"- {error} ({count}): {', '.join(labels)}{more}")
+        if len(groups) > max_groups:
+            lines.append(f"- ... {len(groups) - max_groups} more kinds of failure")
+    if details_path:
+        lines.append(f"Details: {details_path}")
+    return "\n".join(lines)
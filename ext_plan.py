@@ -0,0 +1,177 @@
+"""Two-phase runs: ``prepare`` does every read-only call ahead of time, ``fire`` only the sign POSTs.
+
+Run::
+
+    python auto_checkin.py prepare   # validate tokens, look up roles, write the plan
+    python auto_checkin.py fire      # replay the sign requests of the plan
+
+The plan is a JSON-lines file: a header line, then one line per account with its token
+hash, label and the form bodies of the write calls. Raw tokens are never written, so
+``fire`` reads them again from TOKEN / TOKEN_FILE and matches them by hash.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from loguru import logger
+
+from ext_storage import ResultsWriter, SignLedger, token_hash
+from ext_tokens import TokenEntry
+
+PLAN_VERSION = 1
+
+
+def default_plan_path() -> Path:
+    return Path(os.getenv("PLAN_PATH", ".cache/plan.jsonl"))
+
+
+class ExecutionPlan:
+    """The accounts of a prepared run, keyed by token hash."""
+
+    def __init__(self, header: Dict[str, Any], accounts: Dict[str, Dict[str, Any]]):
+        self.header = header
+        self.accounts = accounts
+
+    @classmethod
+    def load(cls, path: Path) -> "ExecutionPlan":
+        with Path(path).open("r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("plan") != PLAN_VERSION:
+                raise ValueError(f"Unsupported plan version in {path}: {header.get('plan')}")
+            accounts = {}
+            for line in f:
+                account = json.loads(line)
+                accounts[account["token"]] = account
+        return cls(header, accounts)
+
+
+async def prepare_plan(tokens: Iterable[TokenEntry], concurrency: int, path: Path) -> Tuple[int, int]:
+    """Validate every token and look up its role, writing one plan line per valid account.
+
+    :return: The number of planned and of rejected accounts.
+    """
+    from auto_checkin import AsyncKurobbsClient, KurobbsClient
+
+    semaphore = asyncio.Semaphore(concurrency)
+    planned = rejected = 0
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    async def plan_one(position: int, entry: TokenEntry, out):
+        nonlocal planned, rejected
+        name = f"Account {position} ({entry.label})" if entry.label else f"Account {position}"
+        async with semaphore:
+            client = AsyncKurobbsClient(entry.token)
+            try:
+                mine = await client.get_mine_info_async()
+                if not mine:
+                    raise ValueError("token rejected by the server")
+                roles = await client.get_user_game_list_async(user_id=mine.get("mine", {}).get("userId", 0))
+                role_list = (roles or {}).get("defaultRoleList") or []
+                if not role_list:
+                    raise ValueError("no default role")
+            except Exception as e:
+                rejected += 1
+                logger.warning(f"{name}: not planned - {e}")
+                return
+        role = {key: role_list[0].get(key) for key in ("gameId", "serverId", "roleId", "userId")}
+        out.write(json.dumps({
+            "token": token_hash(entry.token),
+            "position": position,
+            "label": entry.label,
+            "checkin": {**KurobbsClient._build_sign_data(role), "reqMonth": None},
+            "sign_in": {"gameId": 2},
+        }, ensure_ascii=False) + "\n")
+        planned += 1
+
+    with tmp_path.open("w", encoding="utf-8") as out:
+        out.write(json.dumps({"plan": PLAN_VERSION, "created_at": time.time(), "api_base": os.getenv("KUROBBS_API_BASE")}) + "\n")
+        tasks = [
+            plan_one(position, entry, out) for position, entry in enumerate(tokens, start=1) if entry.token
+        ]
+        await asyncio.gather(*tasks)
+    os.replace(tmp_path, path)
+    return planned, rejected
+
+
+def encode_form(form: Dict[str, Any], req_month: str) -> str:
+    """The request body ``requests`` would send for ``form``, with reqMonth filled in at fire time."""
+    return urlencode({key: (req_month if key == "reqMonth" else value) for key, value in form.items()
+                      if value is not None or key == "reqMonth"})
+
+
+def fire_plan(
+    plan: ExecutionPlan,
+    tokens: Iterable[TokenEntry],
+    concurrency: int,
+    ledger: Optional[SignLedger] = None,
+    results: Optional[ResultsWriter] = None,
+) -> Tuple[List[str], bool]:
+    """Send the sign requests of every planned account, ``concurrency`` requests at a time.
+
+    All bodies are encoded before the first request, so the loop only sends. Tokens
+    missing from the plan are reported as failed.
+
+    :return: The per-account messages (empty with ``results``) and whether any account failed.
+    """
+    from auto_checkin import KurobbsClient, beijing_now
+
+    req_month = f"{beijing_now().month:02d}"
+    accounts = []
+    requests_to_send = []
+    for position, entry in enumerate(tokens, start=1):
+        if not entry.token:
+            continue
+        name = f"Account {position} ({entry.label})" if entry.label else f"Account {position}"
+        client = KurobbsClient(entry.token, ledger=ledger)
+        planned = plan.accounts.get(token_hash(entry.token))
+        accounts.append((position, entry, name, client, planned))
+        if planned is None:
+            continue
+        for action in client.pending_actions():
+            requests_to_send.append((client, action, encode_form(planned[action[0]], req_month)))
+
+    def send(client: KurobbsClient, action: Tuple[str, str, str, str], body: str) -> float:
+        client.send_sign(action, body)
+        return time.time()
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        finished = list(executor.map(lambda request: send(*request), requests_to_send))
+    logger.info(f"Fired {len(requests_to_send)} request(s) in {time.time() - started:.3f}s")
+    finished_at: Dict[int, float] = {}
+    for (client, *_), done_at in zip(requests_to_send, finished):
+        finished_at[id(client)] = max(done_at, finished_at.get(id(client), started))
+
+    messages, any_failed = [], False
+    for position, entry, name, client, planned in accounts:
+        error_class = error = None
+        if planned is None:
+            error_class, error = "NotPlanned", "not in the plan, run prepare again"
+        elif client.exceptions:
+            error_class, error = type(client.exceptions[0]).__name__, "; ".join(map(str, client.exceptions))
+        message = f"{name}: Error - {error}" if error else f"{name}: {client.msg}"
+        any_failed = any_failed or error is not None
+        if results is None:
+            messages.append(message)
+            continue
+        done_at = finished_at.get(id(client), started)
+        results.write({
+            "position": position,
+            "token": token_hash(entry.token),
+            "label": entry.label,
+            "ok": error is None,
+            "actions": client.outcomes,
+            "latency": round(done_at - started, 3),
+            "error": error_class,
+            "error_message": error,
+            "message": message,
+            "finished_at": round(done_at, 3),
+        })
+    return messages, any_failed
@@ -0,0 +1,143 @@
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from ext_transport import DeadlineExceeded, current_deadline
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are only shared between threads of one process
+    fcntl = None
+
+_STATE = struct.Struct("dd")  # tokens, wall-clock time of the last refill
+
+
+class TokenBucket:
+    """A token bucket whose state lives in a small file guarded by ``flock``.
+
+    Every process on the machine that uses the same ``state_path`` draws from the same
+    bucket, so the aggregate rate stays under ``rate`` no matter how many shards run.
+    """
+
+    def __init__(self, rate: float, burst: float, state_path: Path):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.state_path = Path(state_path)
+        self._thread_lock = threading.Lock()
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked_state(self) -> Iterator[int]:
+        with self._thread_lock:
+            fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield fd
+            finally:
+                os.close(fd)  # also releases the flock
+
+    def _take(self) -> float:
+        """Take a token if one is available; otherwise return how long to wait for it."""
+        with self._locked_state() as fd:
+            now = time.time()
+            raw = os.pread(fd, _STATE.size, 0)
+            tokens, updated_at = _STATE.unpack(raw) if len(raw) == _STATE.size else (self.burst, now)
+            tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            os.pwrite(fd, _STATE.pack(tokens, now), 0)
+            return wait
+
+    def acquire(self) -> float:
+        """Block until a token is available.
+
+        :return: The total time spent waiting.
+        :raises DeadlineExceeded: If the wait would outlast the current deadline.
+        """
+        waited = 0.0
+        while (wait := self._take()) > 0:
+            deadline = current_deadline()
+            if deadline is not None and deadline.remaining() <= wait:
+                raise DeadlineExceeded(f"Rate limit wait of {wait:.2f}s exceeds the run deadline")
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+
+class RateLimiter:
+    """Per-endpoint token buckets, configured as ``path=rate:burst`` pairs.
+
+    The special path ``*`` applies to every endpoint without its own entry; each
+    endpoint still gets its own bucket. Without any configuration it is a no-op.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], state_dir: Path):
+        self.limits = limits
+        self.state_dir = Path(state_dir)
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Build a limiter from RATE_LIMITS (e.g. ``*=10:20;/encourage/signIn/v2=5:5``) and RATE_LIMIT_DIR."""
+        return cls(
+            limits=cls.parse_limits(os.getenv("RATE_LIMITS", "")),
+            state_dir=Path(os.getenv("RATE_LIMIT_DIR", Path(tempfile.gettempdir()) / "kurobbs-ratelimit")),
+        )
+
+    @staticmethod
+    def parse_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+        limits = {}
+        for item in filter(None, (part.strip() for part in spec.split(";"))):
+            path, _, value = item.partition("=")
+            rate, _, burst = value.partition(":")
+            rate, burst = float(rate), float(burst or rate)
+            if rate <= 0 or burst < 1:
+                raise ValueError(f"Invalid RATE_LIMITS entry {item!r}: the rate must be positive and the burst at least 1")
+            limits[path.strip()] = (rate, burst)
+        return limits
+
+    def _bucket(self, url: str) -> Optional[TokenBucket]:
+        parts = urlsplit(url)
+        key = f"{parts.hostname}{parts.path}"
+        with self._lock:
+            if key not in self._buckets:
+                limit = self.limits.get(parts.path) or self.limits.get("*")
+                file_name = key.replace("/", "_").replace(":", "_") + ".bucket"
+                self._buckets[key] = TokenBucket(*limit, self.state_dir / file_name) if limit else None
+            return self._buckets[key]
+
+    def acquire(self, url: str) -> float:
+        """Wait for a token of the bucket of ``url``; returns the time spent waiting."""
+        bucket = self._bucket(url)
+        if bucket is None:
+            return 0.0
+        waited = bucket.acquire()
+        if waited:
+            logger.debug("Rate limited {} for {:.2f}s", url, waited)
+        return waited
+
+
+_default_rate_limiter: Optional[RateLimiter] = None
+_default_rate_limiter_lock = threading.Lock()
+
+
+def get_default_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter, creating it from the environment on first use."""
+    global _default_rate_limiter
+    with _default_rate_limiter_lock:
+        if _default_rate_limiter is None:
+            _default_rate_limiter = RateLimiter.from_env()
+        return _default_rate_limiter
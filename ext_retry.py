@@ -0,0 +1,135 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from loguru import logger
+
+from ext_transport import current_deadline
+
+T = TypeVar("T")
+
+
+class RetryBudget:
+    """A process-wide cap on retries.
+
+    Retries are allowed up to ``min_retries`` plus ``ratio`` times the number of
+    first attempts, so when the server is down for everyone the run sends at most
+    ``1 + ratio`` times its normal request volume instead of ``max_attempts`` times.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.denied = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False if it is exhausted."""
+        with self._lock:
+            if self.retries < self.min_retries + self.ratio * self.requests:
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "retries": self.retries, "denied": self.denied}
+
+
+class RetryPolicy:
+    """Retry transient failures with exponential backoff, full jitter and a shared budget."""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        budget: Optional[RetryBudget] = None,
+        retryable_exceptions: Tuple[Type[BaseException], ...] = (),
+    ):
+        """
+        :param max_attempts: Total attempts per call, including the first one.
+        :param base_delay: Backoff ceiling of the first retry in seconds; doubles with each retry.
+        :param max_delay: Upper bound of the backoff ceiling.
+        :param budget: Retry budget shared by every caller of this policy.
+        :param retryable_exceptions: Exception types that indicate a transient failure.
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.retryable_exceptions = retryable_exceptions
+
+    @classmethod
+    def from_env(cls, retryable_exceptions: Tuple[Type[BaseException], ...] = ()) -> "RetryPolicy":
+        """Build a policy from the RETRY_* environment variables."""
+        return cls(
+            max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("RETRY_MAX_DELAY", "8")),
+            budget=RetryBudget(
+                ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+                min_retries=int(os.getenv("RETRY_BUDGET_MIN", "10")),
+            ),
+            retryable_exceptions=retryable_exceptions,
+        )
+
+    def backoff(self, retry: int) -> float:
+        """Delay before the ``retry``-th retry (1-based), drawn uniformly below the exponential ceiling."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+    def call(
+        self,
+        func: Callable[[], T],
+        retry_result: Optional[Callable[[T], Optional[str]]] = None,
+        description: str = "request",
+    ) -> T:
+        """Call ``func`` until it succeeds, the attempts run out or the budget is spent.
+
+        :param func: The operation to run.
+        :param retry_result: Returns a reason string if a result that did not raise should still be retried.
+        :param description: Used in log messages.
+        :return: The last result; the last exception is re-raised if the final attempt raised.
+        """
+        self.budget.record_request()
+        attempt = 1
+        while True:
+            try:
+                result = func()
+                reason = retry_result(result) if retry_result else None
+            except self.retryable_exceptions as e:
+                if not self._should_retry(attempt, description, f"{type(e).__name__}: {e}"):
+                    raise
+            else:
+                if reason is None or not self._should_retry(attempt, description, reason):
+                    return result
+            attempt += 1
+
+    def _should_retry(self, attempt: int, description: str, reason: str) -> bool:
+        """Sleep and return True if another attempt is allowed."""
+        if attempt >= self.max_attempts:
+            logger.warning(f"{description} failed after {attempt} attempts: {reason}")
+            return False
+        delay = self.backoff(attempt)
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() <= delay:
+            logger.warning(f"{description} failed and there is no time left to retry: {reason}")
+            return False
+        if not self.budget.try_spend():
+            logger.warning(f"{description} failed and the retry budget is exhausted: {reason}")
+            return False
+        logger.info(f"{description} failed ({reason}), retrying in {delay:.2f}s")
+        time.sleep(delay)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return self.budget.stats()
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+from ext_tokens import TokenEntry
+
+# Request start times are counted in buckets of this many seconds.
+BUCKET = 0.1
+
+
+class SpreadScheduler:
+    """Spreads the account starts of a run over ``window`` seconds.
+
+    Each account starts at an offset derived from a hash of its token (and ``salt``),
+    so it lands at about the same point of the window every day while different
+    accounts are spread evenly. The accounts are started in offset order and still
+    share the run's concurrency limit, so a busy window delays accounts rather than
+    exceeding it. Every request is counted (see ``observe``) to report the peak rate.
+    """
+
+    def __init__(self, window: float, salt: str = ""):
+        """
+        :param window: Length of the window in seconds.
+        :param salt: Changes every account's offset, e.g. to move accounts between machines.
+        """
+        self.window = max(0.0, window)
+        self.salt = salt
+        self._lock = threading.Lock()
+        self._origin: Optional[float] = None
+        self._first_start: Optional[float] = None
+        self._last_start: Optional[float] = None
+        self._accounts = 0
+        self._max_lag = 0.0
+        self._buckets: Dict[int, int] = {}
+
+    @classmethod
+    def from_env(cls) -> "SpreadScheduler":
+        """Build a scheduler from SPREAD_WINDOW / SPREAD_SALT."""
+        return cls(window=float(os.getenv("SPREAD_WINDOW", "0")), salt=os.getenv("SPREAD_SALT", ""))
+
+    def offset(self, token: str) -> float:
+        """Seconds after the start of the run at which ``token``'s account starts."""
+        if not token:
+            return 0.0
+        digest = hashlib.sha256(f"{self.salt}{token}".encode("utf-8")).digest()
+        return self.window * int.from_bytes(digest[:8], "big") / 2 ** 64
+
+    def fit(self, available: float):
+        """Shrink the window to ``available`` seconds (e.g. the time left before a deadline)."""
+        if available < self.window:
+            logger.warning(f"Spread window shortened from {self.window:.0f}s to {max(0.0, available):.0f}s by the run deadline")
+            self.window = max(0.0, available)
+
+    def order(self, entries: Iterable[Tuple[int, TokenEntry]]) -> List[Tuple[int, TokenEntry]]:
+        """Read all ``(position, entry)`` pairs and sort them by offset."""
+        return sorted(entries, key=lambda item: self.offset(item[1].token))
+
+    def start(self):
+        """Mark the start of the window."""
+        self._origin = time.monotonic()
+
+    async def wait(self, token: str):
+        """Sleep until the offset of ``token`` is reached."""
+        delay = self._origin + self.offset(token) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def account_started(self, token: str):
+        """Record that ``token``'s account actually started (got its concurrency slot)."""
+        now = time.monotonic()
+        with self._lock:
+            self._accounts += 1
+            self._first_start = now if self._first_start is None else self._first_start
+            self._last_start = now
+            self._max_lag = max(self._max_lag, now - self._origin - self.offset(token))
+
+    def observe(self, latency: float, ok: bool):
+        """Count one request; same signature as ``AimdController.observe``. Safe to call from worker threads."""
+        bucket = int((time.monotonic() - latency) / BUCKET)
+        with self._lock:
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def peak_rate(self) -> float:
+        """Most requests started within any one second, per second."""
+        with self._lock:
+            buckets = dict(self._buckets)
+        if not buckets:
+            return 0.0
+        per_second = round(1 / BUCKET)
+        counts = [buckets.get(bucket, 0) for bucket in range(min(buckets), max(buckets) + 1)]
+        current = peak = sum(counts[:per_second])
+        for i in range(per_second, len(counts)):
+            current += counts[i] - counts[i - per_second]
+            peak = max(peak, current)
+        return float(peak)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            accounts = self._accounts
+            spread = (self._last_start - self._first_start) if self._accounts else 0.0
+            max_lag = self._max_lag
+            requests = sum(self._buckets.values())
+            duration = (max(self._buckets) - min(self._buckets) + 1) * BUCKET if self._buckets else 0.0
+        return {
+            "window": round(self.window, 1),
+            "accounts": accounts,
+            "spread": round(spread, 1),
+            "max_start_lag": round(max_lag, 3),
+            "requests": requests,
+            "peak_rps": self.peak_rate(),
+            "mean_rps": round(requests / duration, 2) if duration else 0.0,
+        }
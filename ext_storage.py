@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: the ledger is only guarded between threads of one process
+    fcntl = None
+
+
+def token_hash(token: str) -> str:
+    """Return a stable, non-reversible key for a token so raw tokens never hit the disk."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def load_json(path: Path, default: Any) -> Any:
+    """Load a JSON file, falling back to ``default`` if it is missing or corrupt."""
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable {path}: {e}")
+        return default
+
+
+def dump_json(path: Path, data: Any):
+    """Atomically write ``data`` as JSON to ``path``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+class ProfileCache:
+    """On-disk cache of the userId and default role of each account.
+
+    Entries are keyed by token hash and expire after ``ttl`` seconds, so a check-in
+    normally only needs the final sign request instead of mineV2 + role lookups.
+    """
+
+    def __init__(self, path: Path, ttl: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: Dict[str, Dict[str, Any]] = load_json(self.path, {}) if ttl > 0 else {}
+
+    @classmethod
+    def from_env(cls) -> "ProfileCache":
+        """Build a cache from PROFILE_CACHE_PATH / PROFILE_CACHE_TTL; a TTL of 0 disables it."""
+        return cls(
+            path=Path(os.getenv("PROFILE_CACHE_PATH", ".cache/profiles.json")),
+            ttl=float(os.getenv("PROFILE_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached role info of ``token`` if present and not expired."""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(token_hash(token))
+        if not entry or time.time() - entry.get("cached_at", 0) > self.ttl:
+            return None
+        return entry["role"]
+
+    def put(self, token: str, role_info: Dict[str, Any]):
+        """Remember the role info used for a successful lookup."""
+        if self.ttl <= 0:
+            return
+        role = {key: role_info.get(key) for key in ("gameId", "serverId", "roleId", "userId")}
+        with self._lock:
+            self._entries[token_hash(token)] = {"role": role, "cached_at": time.time()}
+            self._dirty = True
+
+    def invalidate(self, token: str):
+        """Forget the cached profile of ``token``."""
+        with self._lock:
+            if self._entries.pop(token_hash(token), None) is not None:
+                self._dirty = True
+
+    def flush(self):
+        """Write pending changes to disk, dropping expired entries."""
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            self._entries = {k: v for k, v in self._entries.items() if now - v.get("cached_at", 0) <= self.ttl}
+            dump_json(self.path, self._entries)
+            self._dirty = False
+
+
+class SignLedger:
+    """Append-only per-day record of the sign actions that already succeeded.
+
+    Each line is ``{"token": <token hash>, "date": <Beijing date>, "action": <action>}``
+    and is written as soon as the action succeeds, so a crashed or partially failed run
+    keeps what it achieved. With ``resume`` enabled, those actions are skipped on rerun.
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._done = set()
+        self._file = None
+        self._lock_fd: Optional[int] = None
+        self._compacted = False
+        self._done.update(self._read_keys())
+
+    @classmethod
+    def from_env(cls) -> "SignLedger":
+        """Build a ledger from SIGN_LEDGER_PATH; RESUME=1 skips actions already done today."""
+        return cls(
+            path=Path(os.getenv("SIGN_LEDGER_PATH", ".cache/sign_ledger.jsonl")),
+            resume=os.getenv("RESUME", "").lower() in ("1", "true", "yes"),
+        )
+
+    def _read_keys(self) -> Iterator[Tuple[str, str, str]]:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+                yield record["token"], record["date"], record["action"]
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Ignoring malformed ledger line in {self.path}")
+
+    @contextmanager
+    def _file_locked(self) -> Iterator[None]:
+        """Hold an exclusive ``flock`` on ``<ledger>.lock`` (see ext_ratelimit), shared by every process using the ledger."""
+        if self._lock_fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_fd = os.open(self.path.with_name(f"{self.path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _replaced(self) -> bool:
+        """Whether the open file is no longer the one at ``path`` (another process compacted it)."""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def is_done(self, token: str, date: str, action: str) -> bool:
+        """Whether ``action`` already succeeded for ``token`` on ``date`` and may be skipped."""
+        return self.resume and (token_hash(token), date, action) in self._done
+
+    def record(self, token: str, date: str, action: str):
+        """Persist a successful action immediately."""
+        key = (token_hash(token), date, action)
+        with self._lock:
+            if key in self._done and self._file is not None:
+                return
+            with self._file_locked():
+                if not self._compacted:
+                    self._compact(date)
+                    self._compacted = True
+                if self._file is None or self._replaced():
+                    if self._file is not None:
+                        self._file.close()
+                    self._file = self.path.open("a", encoding="utf-8")
+                if key in self._done:
+                    return
+                self._done.add(key)
+                self._file.write(json.dumps({"token": key[0], "date": date, "action": action}) + "\n")
+                self._file.flush()
+
+    def _compact(self, today: str):
+        """Drop records of previous days so the ledger stays small.
+
+        Called under the file lock; the file is re-read so records appended by other
+        processes since this one loaded it are kept, and only rewritten if it has stale
+        records.
+        """
+        keys = set(self._read_keys())
+        current = {key for key in keys if key[1] == today}
+        self._done = {key for key in self._done if key[1] == today} | current
+        if current == keys:
+            return
+        dump_lines = "".join(
+            json.dumps({"token": token, "date": date, "action": action}) + "\n" for token, date, action in current
+        )
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(dump_lines, encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
+            self._compacted = False
+
+
+class ResultsWriter:
+    """Per-account results of a run as JSON lines, written as accounts complete.
+
+    Records are buffered and written in batches of ``batch_size`` (or once
+    ``flush_interval`` seconds have passed), so a crash loses at most the last batch
+    while a large run does not pay for a write per account. The file is truncated
+    when the writer is opened; ``read()`` streams the records back, e.g. for the
+    notification.
+    """
+
+    def __init__(self, path: Path, batch_size: int = 100, flush_interval: float = 2.0):
+        self.path = Path(path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("w", encoding="utf-8")
+
+    @classmethod
+    def from_env(cls) -> "ResultsWriter":
+        """Build a writer from RESULTS_PATH / RESULTS_BATCH_SIZE / RESULTS_FLUSH_INTERVAL."""
+        return cls(
+            path=Path(os.getenv("RESULTS_PATH", ".cache/results.jsonl")),
+            batch_size=int(os.getenv("RESULTS_BATCH_SIZE", "100")),
+            flush_interval=float(os.getenv("RESULTS_FLUSH_INTERVAL", "2")),
+        )
+
+    def write(self, record: Dict[str, Any]):
+        """Queue one record; the batch is written once it is full or old enough."""
+        with self._lock:
+            self._buffer.append(json.dumps(record, ensure_ascii=False) + "\n")
+            if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer and self._file is not None:
+            self._file.write("".join(self._buffer))
+            self._file.flush()
+        self._buffer.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def read(self) -> Iterator[Dict[str, Any]]:
+        """Stream the records written so far."""
+        self.flush()
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Ignoring malformed result line in {self.path}")
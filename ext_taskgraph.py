@@ -0,0 +1,79 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Sequence
+
+
+class TaskNode:
+    """A single step of an account workflow.
+
+    ``func`` is awaited once all ``deps`` have finished and receives their results as
+    keyword arguments named after the dependency nodes.
+    """
+
+    def __init__(self, name: str, func: Callable[..., Awaitable[Any]], deps: Sequence[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+    def __repr__(self):
+        return f"TaskNode({self.name!r}, deps={self.deps!r})"
+
+
+class TaskGraphError(Exception):
+    """Raised when a task graph is malformed (unknown dependency or cycle)."""
+    pass
+
+
+def _check_graph(nodes: Dict[str, TaskNode]):
+    """Reject unknown dependencies and cycles before anything is scheduled."""
+    for node in nodes.values():
+        for dep in node.deps:
+            if dep not in nodes:
+                raise TaskGraphError(f"{node.name} depends on unknown node {dep}")
+    visiting, visited = set(), set()
+
+    def visit(name: str):
+        if name in visited:
+            return
+        if name in visiting:
+            raise TaskGraphError(f"Dependency cycle through {name}")
+        visiting.add(name)
+        for dep in nodes[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in nodes:
+        visit(name)
+
+
+async def run_task_graph(nodes: Iterable[TaskNode]) -> Dict[str, Any]:
+    """Run the nodes with every independent branch in parallel.
+
+    Nodes sharing a name are de-duplicated (the first one wins), so several actions
+    can depend on the same upstream request and it is only sent once. A failing node
+    makes all of its dependents fail with the same exception.
+
+    :return: A mapping of node name to its result, or to the exception it raised.
+    """
+    graph: Dict[str, TaskNode] = {}
+    for node in nodes:
+        graph.setdefault(node.name, node)
+    _check_graph(graph)
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run_node(node: TaskNode) -> Any:
+        upstream = {dep: await tasks[dep] for dep in node.deps}
+        return await node.func(**upstream)
+
+    def schedule(name: str) -> asyncio.Task:
+        if name not in tasks:
+            for dep in graph[name].deps:
+                schedule(dep)
+            tasks[name] = asyncio.ensure_future(run_node(graph[name]))
+        return tasks[name]
+
+    order: List[str] = list(graph)
+    for name in order:
+        schedule(name)
+    results = await asyncio.gather(*(tasks[name] for name in order), return_exceptions=True)
+    return dict(zip(order, results))
@@ -0,0 +1,54 @@
+import os
+import sys
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO
+
+
+class TokenEntry(NamedTuple):
+    token: str
+    label: Optional[str] = None
+
+
+def parse_token_line(line: str) -> Optional[TokenEntry]:
+    """Parse ``<token> [label]``; blank lines and ``#`` comments yield None."""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    token, *label = line.split(None, 1)
+    return TokenEntry(token, label[0].strip() if label else None)
+
+
+def _open_source(source: str) -> TextIO:
+    """Open ``-`` (stdin), ``fd:N`` (an inherited file descriptor) or a file path."""
+    if source == "-":
+        return os.fdopen(sys.stdin.fileno(), "r", encoding="utf-8", closefd=False)
+    if source.startswith("fd:"):
+        return os.fdopen(int(source[3:]), "r", encoding="utf-8")
+    return open(source, "r", encoding="utf-8")
+
+
+def read_token_stream(source: str) -> Iterator[TokenEntry]:
+    """Lazily yield the tokens of ``source``, one per line, without reading it all first.
+
+    The file is closed when the iterator is exhausted or garbage-collected.
+    """
+    with _open_source(source) as stream:
+        for line in stream:
+            entry = parse_token_line(line)
+            if entry is not None:
+                yield entry
+
+
+def split_token_env(token_str: str) -> Iterable[TokenEntry]:
+    """Tokens of the ``;``-separated TOKEN variable; empty positions are kept so they can be reported."""
+    return (TokenEntry(token.strip()) for token in token_str.split(";"))
+
+
+def tokens_from_env() -> Optional[Iterable[TokenEntry]]:
+    """Token source of this run: TOKEN_FILE if set, else TOKEN, else None."""
+    token_file = os.getenv("TOKEN_FILE")
+    if token_file:
+        return read_token_stream(token_file)
+    token_str = os.getenv("TOKEN")
+    if token_str:
+        return split_token_env(token_str)
+    return None
@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of sending a request once the current deadline has passed."""
+    pass
+
+
+class Deadline:
+    """A point in (monotonic) time by which work has to be finished."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """The innermost deadline of the running context, if any."""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """Bound every request made in this context (including threads started via asyncio.to_thread).
+
+    A nested scope can only shorten the outer deadline, never extend it. ``None`` keeps the outer one.
+    """
+    outer = _current_deadline.get()
+    deadline = outer
+    if seconds is not None:
+        deadline = Deadline(seconds)
+        if outer is not None and outer.expires_at < deadline.expires_at:
+            deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+class _DeadlinePoolMixin:
+    """Waits for a free connection of a full, blocking pool no longer than the current deadline allows.
+
+    requests never passes urllib3's ``pool_timeout``, so without a deadline the wait is unbounded.
+    """
+
+    def urlopen(self, method, url, *args, **kwargs):
+        deadline = current_deadline()
+        if kwargs.get("pool_timeout") is None and deadline is not None:
+            kwargs["pool_timeout"] = max(deadline.remaining(), 0.001)
+        try:
+            return super().urlopen(method, url, *args, **kwargs)
+        except EmptyPoolError as e:
+            raise DeadlineExceeded("Run deadline exceeded while waiting for a pooled connection") from e
+
+
+class _DeadlineHTTPConnectionPool(_DeadlinePoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _DeadlineHTTPSConnectionPool(_DeadlinePoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class HttpTransport:
+    """A process-wide HTTP transport keeping one keep-alive connection pool per host.
+
+    All KurobbsClient instances (and the notification senders) share the same
+    ``requests.Session`` so that consecutive requests to api.kurobbs.com reuse the
+    TCP+TLS connection instead of paying a new handshake every time.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 32,
+        idle_timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+    ):
+        """
+        :param pool_connections: How many per-host pools to keep before the least recently used one is dropped.
+        :param pool_maxsize: Maximum number of connections kept open per host.
+        :param idle_timeout: Seconds a host may stay unused before its idle connections are closed.
+        :param connect_timeout: Seconds to wait for a connection to be established.
+        :param read_timeout: Seconds to wait between bytes of the response.
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._lock = threading.Lock()
+        self._last_used: Dict[str, float] = {}
+        self._retired_connections = 0
+        self._retired_requests = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        adapter.poolmanager.pool_classes_by_scheme = {
+            "http": _DeadlineHTTPConnectionPool,
+            "https": _DeadlineHTTPSConnectionPool,
+        }
+        self._pools = adapter.poolmanager.pools
+        self._pools.dispose_func = self._retire_pool
+
+    @classmethod
+    def from_env(cls) -> "HttpTransport":
+        """Build a transport from the HTTP_* environment variables."""
+        return cls(
+            pool_connections=int(os.getenv("HTTP_POOL_CONNECTIONS", "10")),
+            pool_maxsize=int(os.getenv("HTTP_POOL_MAXSIZE", "32")),
+            idle_timeout=float(os.getenv("HTTP_IDLE_TIMEOUT", "60")),
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "15")),
+        )
+
+    def _retire_pool(self, pool):
+        """Keep the counters of a pool that is being dropped, then close it."""
+        with self._lock:
+            self._retired_connections += pool.num_connections
+            self._retired_requests += pool.num_requests
+        pool.close()
+
+    def _expire_idle(self, host: str):
+        """Drop the pool of ``host`` if it has been idle for longer than idle_timeout."""
+        now = time.monotonic()
+        with self._lock:
+            last_used = self._last_used.get(host)
+            self._last_used[host] = now
+        if last_used is None or now - last_used <= self.idle_timeout:
+            return
+        for key in list(self._pools.keys()):
+            if key.key_host == host:
+                logger.debug("Closing idle connections to {}", host)
+                self._pools.pop(key, None)
+
+    def _timeout(self) -> tuple:
+        """Connect/read timeouts, shortened to what is left of the current deadline."""
+        connect_timeout, read_timeout = self.connect_timeout, self.read_timeout
+        deadline = current_deadline()
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise DeadlineExceeded("Run deadline exceeded")
+            connect_timeout, read_timeout = min(connect_timeout, remaining), min(read_timeout, remaining)
+        return connect_timeout, read_timeout
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send a request through the shared session."""
+        kwargs.setdefault("timeout", self._timeout())
+        self._expire_idle(urlsplit(url).hostname or "")
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return connection pool statistics for the whole process."""
+        with self._lock:
+            connections = self._retired_connections
+            requests_sent = self._retired_requests
+        for key in self._pools.keys():
+            pool = self._pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+        reused = max(requests_sent - connections, 0)
+        return {
+            "requests": requests_sent,
+            "connections": connections,
+            "handshakes_avoided": reused,
+            "reuse_ratio": round(reused / requests_sent, 4) if requests_sent else 0.0,
+            "open_pools": len(self._pools),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> HttpTransport:
+    """Return the process-wide transport, creating it from the environment on first use."""
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport.from_env()
+        return _default_transport
+
+
+def set_default_transport(transport: HttpTransport):
+    """Replace the process-wide transport (e.g. to tune pool sizes for a run)."""
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = transport